@@ -1,93 +1,224 @@
 # myshop/cart/cart.py
 from decimal import Decimal
 from django.conf import settings
+from django.core.cache import cache
 from coupons.models import Coupon
 from django.apps import apps
 
-def _cart_key() -> str:
-    return getattr(settings, "CART_SESSION_ID", "cart")
+from .pricing import Destination, Pricing, price_cart
+from .storage import get_storage
+
+# How long a looked-up coupon is reused (also dropped on Coupon save/delete)
+COUPON_CACHE_TTL = getattr(settings, "COUPON_CACHE_TTL", 60)
+_NO_COUPON = "missing"  # cached marker for ids that no longer exist
+_UNSET = object()
+# {"shipping_method", "country", "state"} used for the shipping/tax estimate
+SHIPPING_SESSION_KEY = "cart_shipping"
+
+def cart_count(request) -> int:
+    """Items in the request's cart, from the maintained count (no DB queries)."""
+    return get_storage(request).count()
+
+def coupon_cache_key(coupon_id) -> str:
+    return f"cart:coupon:{coupon_id}"
+
+def get_cached_coupon(coupon_id):
+    """Coupon by id through the cache (None if unknown)."""
+    if not coupon_id:
+        return None
+    key = coupon_cache_key(coupon_id)
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(id=coupon_id).first() or _NO_COUPON
+        cache.set(key, coupon, COUPON_CACHE_TTL)
+    return None if coupon == _NO_COUPON else coupon
+
 
 class Cart:
     def __init__(self, request):
         self.session = request.session
-        key = _cart_key()
-        cart = self.session.get(key)
-        if not cart:
-            cart = self.session[key] = {}
-        self.cart = cart
+        self.store = get_storage(request)
+        self.cart = self.store.load()
         self.coupon_id = self.session.get("coupon_id")
+        self._pricing = None    # memoised by pricing(); reset by every mutation
+        self._products = None   # product_id (str) -> Product, for rows()
+        self._rows = None
+        self._coupon = _UNSET
 
     def add(self, product, quantity=1, override_quantity=False):
+        """
+        Add `quantity` of a product, or with override_quantity set the line to
+        it. Setting a line to 0 or less removes it; adding 0 or less is ignored.
+        """
         product_id = str(product.id)
+        quantity = int(quantity)
+        if override_quantity and quantity <= 0:
+            self.remove(product_id)
+            return
+        if not override_quantity and quantity <= 0:
+            return
         if product_id not in self.cart:
             self.cart[product_id] = {
                 "quantity": 0,
-                "price": str(product.price),  # keep as str in session
+                "price": str(product.price),  # keep as str in storage
             }
+            self._products = {**(self._products or {}), product_id: product}
+        line = self.cart[product_id]
         if override_quantity:
-            self.cart[product_id]["quantity"] = int(quantity)
+            line["quantity"] = quantity
+            self.store.set(product_id, quantity, line["price"])
         else:
-            self.cart[product_id]["quantity"] += int(quantity)
-        self.save()
+            line["quantity"] += quantity
+            self.store.add(product_id, quantity, line["price"])
+        self._pricing = None
+
+    def set_quantity(self, product_id, quantity):
+        """Change an existing line's quantity (<= 0 removes it)."""
+        product_id = str(product_id)
+        line = self.cart.get(product_id)
+        if line is None:
+            return
+        if int(quantity) <= 0:
+            self.remove(product_id)
+            return
+        line["quantity"] = int(quantity)
+        self.store.set(product_id, line["quantity"], line["price"])
+        self._pricing = None
+
+    def apply(self, ops, products):
+        """
+        Apply [(op, product_id, quantity)] in one storage transaction, with the
+        same rules as add()/set_quantity()/remove(). `products` maps id -> Product
+        for every add/set and is reused for hydration.
+        """
+        self.cart = self.store.batch(
+            (op, str(pid), int(qty), str(products[pid].price) if op != "remove" else "")
+            for op, pid, qty in ops
+        )
+        self._products = {**(self._products or {}), **{str(pid): p for pid, p in products.items()}}
+        self._pricing = None
 
     def save(self):
-        self.session[_cart_key()] = _to_jsonable(self.cart)
-        self.session.modified = True
+        """Write the whole cart back (for callers that edited self.cart directly)."""
+        self.store.replace(_to_jsonable(self.cart))
+        self._pricing = None
 
     def remove(self, product):
-        product_id = str(product.id)
+        """Drop a line; accepts a Product or a product id."""
+        product_id = str(getattr(product, "id", product))
         if product_id in self.cart:
             del self.cart[product_id]
-            self.save()
+            self.store.remove(product_id)
+            self._pricing = None
+
+    # ---- pricing ----
+    @property
+    def destination(self) -> Destination:
+        return Destination.from_session(self.session.get(SHIPPING_SESSION_KEY))
+
+    def set_destination(self, shipping_method=None, country=None, state=None):
+        """Remember where the cart ships to, for the shipping and tax estimate."""
+        current = self.destination
+        self.session[SHIPPING_SESSION_KEY] = {
+            "shipping_method": shipping_method or current.shipping_method,
+            "country": country or current.country,
+            "state": state if state is not None else current.state,
+        }
+        self.session.modified = True
+        self._pricing = None
+
+    def pricing(self) -> Pricing:
+        """
+        Subtotal, coupon, shipping and tax in one pass (cart/pricing.py).
+        Reused until the cart, coupon or destination changes.
+        """
+        if self._pricing is None:
+            self._pricing = price_cart(self.cart, self.coupon, self.destination)
+            self._rows = None
+        return self._pricing
+
+    def _product_map(self):
+        """product_id -> Product for the cart's lines; only unknown ids are queried."""
+        if self._products is None:
+            self._products = {}
+        missing = [pid for pid in self.cart if pid not in self._products]
+        if missing:
+            Product = get_product_model()
+            found = {str(p.id): p for p in Product.objects.filter(id__in=missing)}
+            for pid in missing:
+                self._products[pid] = found.get(pid)  # None: product deleted
+        return self._products
+
+    def rows(self):
+        """
+        Hydrated lines, built once (one product query) and reused by every
+        iteration, so attributes views add to a row (e.g. forms) stay visible
+        to the template. Lines whose product no longer exists are skipped.
+        """
+        lines = self.pricing().lines
+        if self._rows is None:
+            products_by_id = self._product_map()
+            self._rows = [
+                {
+                    "product": products_by_id[pid],
+                    "price": lines[pid].price,
+                    "quantity": lines[pid].quantity,
+                    "total_price": lines[pid].total,
+                }
+                for pid in self.cart
+                if products_by_id.get(pid) is not None
+            ]
+        return self._rows
 
     def __iter__(self):
-        """Yield computed, non-session objects without mutating session data."""
-        Product = get_product_model()
-        product_ids = list(self.cart.keys())
-
-        products_by_id = {str(p.id): p for p in Product.objects.filter(id__in=product_ids)}
-
-        for pid, data in self.cart.items():
-            product = products_by_id.get(pid)
-            if not product:
-                continue
-            price = Decimal(data["price"])
-            qty = int(data["quantity"])
-            yield {
-                "product": product,
-                "price": price,
-                "quantity": qty,
-                "total_price": price * qty,
-            }
+        return iter(self.rows())
 
     def __len__(self):
         return sum(int(item["quantity"]) for item in self.cart.values())
 
     def get_total_price(self):
-        return sum(Decimal(item["price"]) * int(item["quantity"]) for item in self.cart.values())
+        return self.pricing().subtotal
 
     @property
     def coupon(self):
-        if self.coupon_id:
-            try:
-                return Coupon.objects.get(id=self.coupon_id)
-            except Coupon.DoesNotExist:
-                return None
-        return None
+        if self._coupon is _UNSET:
+            self._coupon = get_cached_coupon(self.coupon_id)
+        return self._coupon
+
+    def apply_coupon(self, coupon):
+        self.session["coupon_id"] = coupon.id
+        self.session.modified = True
+        self.coupon_id = coupon.id
+        self._coupon = coupon
+        self._pricing = None
+
+    def remove_coupon(self):
+        self.session.pop("coupon_id", None)
+        self.session.modified = True
+        self.coupon_id = None
+        self._coupon = None
+        self._pricing = None
 
     def get_discount(self):
-        if self.coupon:
-            return (self.coupon.discount / Decimal(100)) * self.get_total_price()
-        return Decimal(0)
+        return self.pricing().discount
 
     def get_total_price_after_discount(self):
-        return self.get_total_price() - self.get_discount()
+        return self.pricing().merchandise
+
+    def get_shipping(self):
+        return self.pricing().shipping
+
+    def get_tax(self):
+        return self.pricing().tax
+
+    def get_grand_total(self):
+        return self.pricing().grand_total
 
     def clear(self):
-        key = _cart_key()
-        if key in self.session:
-            del self.session[key]
-        self.session.modified = True
+        self.store.clear()
+        self.cart = {}
+        self._pricing = None
+        self._products = None
 
 
 def get_product_model():
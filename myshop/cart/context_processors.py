@@ -1,5 +1,4 @@
-from .cart import Cart
+from .cart import cart_count
 
 def cart_items_count(request):
-    cart = Cart(request)
-    return {"cart_items_count": len(cart)}
+    return {"cart_items_count": cart_count(request)}
@@ -0,0 +1,17 @@
+# cart/management/commands/persist_carts.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from cart.storage import persist_carts
+
+
+class Command(BaseCommand):
+    help = "Copy carts changed in Redis to CartSnapshot rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Carts read per round trip.")
+
+    def handle(self, *args, **opts):
+        written = persist_carts(opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Persisted {written} carts."))
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from django.core.mail import EmailMultiAlternatives
+from django.db.models import F, Q
 from django.template.loader import render_to_string
 from django.conf import settings
 from cart.models import CartSnapshot
@@ -15,7 +16,13 @@ class Command(BaseCommand):
 
     def handle(self, *args, **opts):
         cutoff = timezone.now() - timedelta(hours=opts["hours"])
-        qs = CartSnapshot.objects.filter(updated__lte=cutoff).order_by("-updated")
+        # once per version of a cart: skip carts already emailed since their last change
+        qs = (
+            CartSnapshot.objects.filter(updated__lte=cutoff)
+            .filter(Q(notified_at__isnull=True) | Q(notified_at__lt=F("updated")))
+            .select_related("user")
+            .order_by("-updated")
+        )
         sent = 0
         for snap in qs:
             to = (snap.user.email if snap.user and snap.user.email else snap.email).strip()
@@ -36,5 +43,7 @@ class Command(BaseCommand):
             m = EmailMultiAlternatives(subj, txt, settings.DEFAULT_FROM_EMAIL, [to])
             m.attach_alternative(html, "text/html")
             m.send(fail_silently=False)
+            # update() leaves the auto_now `updated` alone
+            CartSnapshot.objects.filter(pk=snap.pk).update(notified_at=timezone.now())
             sent += 1
         self.stdout.write(self.style.SUCCESS(f"Sent {sent} abandoned cart emails"))
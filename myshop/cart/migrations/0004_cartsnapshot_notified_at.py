@@ -0,0 +1,18 @@
+# Generated by Django 5.0.11 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_cart_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartsnapshot',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
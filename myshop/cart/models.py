@@ -0,0 +1,23 @@
+# cart/models.py
+from django.conf import settings
+from django.db import models
+
+
+class CartSnapshot(models.Model):
+    """
+    DB copy of a Redis-stored cart (cart/storage.py persist_carts), used for
+    abandoned-cart emails and to restore a user's cart if Redis loses it.
+    """
+    key = models.CharField(max_length=64, unique=True)  # Redis hash key
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True,
+        on_delete=models.CASCADE, related_name="cart_snapshots",
+    )
+    email = models.EmailField(blank=True)
+    data = models.JSONField(default=dict)  # {"items": [{"product_id", "name", "qty", "price"}]}
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # last abandoned-cart email; another goes out only if the cart changes after it
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"CartSnapshot({self.key})"
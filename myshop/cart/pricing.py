@@ -0,0 +1,93 @@
+# cart/pricing.py
+"""
+One pricing pass for a cart: subtotal -> coupon -> shipping -> tax.
+
+Works on stored lines ({"<product_id>": {"quantity", "price"}}) only, so
+pricing never needs the product table; the unit price is the one captured
+when the line was added. Shipping and tax use the same rules as
+Order.update_totals (an unsaved Order supplies them), so the cart estimate
+matches what the order will charge.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Mapping, Optional
+
+from orders.models import Order
+
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class Destination:
+    shipping_method: str = "standard"
+    country: str = "US"
+    state: str = ""
+
+    @classmethod
+    def from_session(cls, data: Optional[Mapping]) -> "Destination":
+        data = data or {}
+        return cls(
+            shipping_method=(data.get("shipping_method") or "standard").lower(),
+            country=(data.get("country") or "US").upper(),
+            state=(data.get("state") or "").upper(),
+        )
+
+
+@dataclass(frozen=True)
+class Line:
+    price: Decimal
+    quantity: int
+    total: Decimal
+
+
+@dataclass
+class Pricing:
+    lines: Dict[str, Line] = field(default_factory=dict)
+    count: int = 0
+    subtotal: Decimal = Decimal("0.00")
+    discount: Decimal = Decimal("0.00")
+    shipping: Decimal = Decimal("0.00")
+    tax_rate: Decimal = Decimal("0")
+    tax: Decimal = Decimal("0.00")
+
+    @property
+    def merchandise(self) -> Decimal:
+        """Subtotal after the coupon (what the cart pages call the total)."""
+        return self.subtotal - self.discount
+
+    @property
+    def grand_total(self) -> Decimal:
+        return self.merchandise + self.shipping + self.tax
+
+
+def price_cart(stored: Mapping[str, dict], coupon=None, destination: Optional[Destination] = None) -> Pricing:
+    p = Pricing()
+
+    # subtotal
+    for pid, data in stored.items():
+        price = Decimal(data["price"])
+        qty = int(data["quantity"])
+        line = Line(price, qty, price * qty)
+        p.lines[pid] = line
+        p.subtotal += line.total
+        p.count += qty
+    p.subtotal = p.subtotal.quantize(CENT)
+
+    # coupon (% off the merchandise)
+    if coupon is not None:
+        p.discount = (p.subtotal * Decimal(coupon.discount) / Decimal(100)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    # shipping and tax
+    if p.lines:
+        destination = destination or Destination()
+        rules = Order(
+            shipping_method=destination.shipping_method,
+            ship_country=destination.country,
+            ship_state=destination.state,
+        )
+        p.shipping = rules.compute_shipping(p.merchandise)
+        p.tax_rate = rules.effective_tax_rate()
+        p.tax = rules.compute_tax(p.merchandise, p.shipping)
+    return p
@@ -0,0 +1,22 @@
+# cart/signals.py
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from coupons.models import Coupon
+
+from .cart import coupon_cache_key
+from .storage import RedisCartStorage, get_storage, merge_anonymous_cart
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def _drop_cached_coupon(sender, instance, **kwargs):
+    cache.delete(coupon_cache_key(instance.pk))
+
+
+@receiver(user_logged_in)
+def _merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None and isinstance(get_storage(request), RedisCartStorage):
+        merge_anonymous_cart(request, user)
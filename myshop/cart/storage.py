@@ -0,0 +1,452 @@
+# cart/storage.py
+"""
+Where cart lines live.
+
+Cart (cart/cart.py) talks to a storage backend chosen by settings.CART_STORAGE:
+
+- SessionCartStorage keeps the original layout in the session
+  ({"<product_id>": {"quantity": int, "price": "9.99"}} plus a maintained
+  count), so every change rewrites the session.
+- RedisCartStorage keeps one Redis hash per cart, with fields q:<id> (quantity),
+  p:<id> (unit price when first added) and n (total quantity). Line changes
+  (and batches of them) are single HINCRBY/HSET/HDEL transactions and the
+  session is never written for them. Anonymous carts are keyed by a random
+  token stored in the session once; signed-in users are keyed by user id and
+  their anonymous cart is merged in at login (signals.py), or on the first
+  authenticated request for logins that bypass Django's (JWT). Changed carts are queued in a set, and
+  `persist_carts()` (celery task / persist_carts command) copies them to
+  CartSnapshot rows, which the abandoned-cart emails read and which seed a
+  user's cart when Redis has lost it. While Redis is degraded the session
+  backend is used, and those lines are merged into Redis on the next read.
+"""
+from __future__ import annotations
+
+import secrets
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.redis_client import REDIS_ERRORS, get_redis, is_degraded, mark_degraded
+
+# total quantity, kept next to the cart so badges never hydrate products
+CART_COUNT_KEY = "cart_count"
+# session key holding an anonymous visitor's Redis cart token
+CART_TOKEN_KEY = "cart_token"
+DIRTY_KEY = "cart:dirty"
+CART_TTL: int = int(getattr(settings, "CART_REDIS_TTL", 30 * 24 * 3600))
+
+Lines = Dict[str, dict]
+
+
+def _cart_key() -> str:
+    return getattr(settings, "CART_SESSION_ID", "cart")
+
+
+def apply_ops(lines: Lines, ops: Iterable[tuple]) -> Lines:
+    """
+    Apply (op, pid, quantity, price) tuples to a copy of `lines` with Cart's
+    rules: "add" increments (<= 0 ignored), "set" sets (<= 0 removes),
+    "remove" drops the line. A line keeps the price it was first added at.
+    """
+    lines = {pid: dict(line) for pid, line in lines.items()}
+    for op, pid, quantity, price in ops:
+        if op == "remove" or (op == "set" and quantity <= 0):
+            lines.pop(pid, None)
+        elif op == "add" and quantity > 0:
+            line = lines.setdefault(pid, {"quantity": 0, "price": price})
+            line["quantity"] = int(line["quantity"]) + quantity
+        elif op == "set":
+            lines.setdefault(pid, {"quantity": 0, "price": price})["quantity"] = quantity
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Session
+# ---------------------------------------------------------------------------
+class SessionCartStorage:
+    def __init__(self, request):
+        self.session = request.session
+
+    def load(self) -> Lines:
+        cart = self.session.get(_cart_key())
+        return {pid: dict(line) for pid, line in cart.items()} if isinstance(cart, dict) else {}
+
+    def _write(self, lines: Lines) -> None:
+        self.session[_cart_key()] = lines
+        self.session[CART_COUNT_KEY] = sum(int(line["quantity"]) for line in lines.values())
+        self.session.modified = True
+
+    def add(self, pid: str, quantity: int, price: str) -> None:
+        lines = self.load()
+        line = lines.setdefault(pid, {"quantity": 0, "price": price})
+        line["quantity"] = int(line["quantity"]) + int(quantity)
+        self._write(lines)
+
+    def set(self, pid: str, quantity: int, price: str) -> None:
+        lines = self.load()
+        lines.setdefault(pid, {"quantity": 0, "price": price})["quantity"] = int(quantity)
+        self._write(lines)
+
+    def remove(self, pid: str) -> None:
+        lines = self.load()
+        if lines.pop(pid, None) is not None:
+            self._write(lines)
+
+    def batch(self, ops: Iterable[tuple]) -> Lines:
+        lines = apply_ops(self.load(), ops)
+        self._write(lines)
+        return lines
+
+    def replace(self, lines: Lines) -> None:
+        self._write({pid: {"quantity": int(l["quantity"]), "price": str(l["price"])} for pid, l in lines.items()})
+
+    def clear(self) -> None:
+        self.session.pop(_cart_key(), None)
+        self.session.pop(CART_COUNT_KEY, None)
+        self.session.modified = True
+
+    def count(self) -> int:
+        cart = self.session.get(_cart_key())
+        if not cart:
+            return 0
+        count = self.session.get(CART_COUNT_KEY)
+        if isinstance(count, int):
+            return count
+        # carts written before the count existed
+        return sum(int(line.get("quantity", 0)) for line in cart.values())
+
+
+# ---------------------------------------------------------------------------
+# Redis
+# ---------------------------------------------------------------------------
+def _s(v) -> str:
+    return v.decode() if isinstance(v, bytes) else v
+
+
+def user_cart_key(user_id) -> str:
+    return f"cart:u:{user_id}"
+
+
+def token_cart_key(token: str) -> str:
+    return f"cart:s:{token}"
+
+
+def decode_hash(raw: dict) -> Lines:
+    """HGETALL result -> {pid: {"quantity", "price"}} (non-positive lines dropped)."""
+    fields = {_s(k): _s(v) for k, v in raw.items()}
+    lines: Lines = {}
+    for field, value in fields.items():
+        if field.startswith("q:") and int(value) > 0:
+            pid = field[2:]
+            lines[pid] = {"quantity": int(value), "price": fields.get(f"p:{pid}", "0")}
+    return lines
+
+
+def merge_into(r, key: str, lines: Lines) -> None:
+    """Add `lines` to the cart hash at `key` (one MULTI)."""
+    pipe = r.pipeline(transaction=True)
+    for pid, line in lines.items():
+        qty = int(line["quantity"])
+        pipe.hincrby(key, f"q:{pid}", qty)
+        pipe.hsetnx(key, f"p:{pid}", str(line["price"]))
+        pipe.hincrby(key, "n", qty)
+    pipe.expire(key, CART_TTL)
+    pipe.sadd(DIRTY_KEY, key)
+    pipe.execute()
+
+
+class RedisCartStorage:
+    def __init__(self, request):
+        self.session = request.session
+        self.fallback = SessionCartStorage(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            self.key: Optional[str] = user_cart_key(user.pk)
+            if self.session.get(CART_TOKEN_KEY):
+                # signed in without user_logged_in firing (SimpleJWT tokens):
+                # merge the visitor's cart on the first authenticated access
+                merge_anonymous_cart(request, user)
+        else:
+            token = self.session.get(CART_TOKEN_KEY)
+            self.key = token_cart_key(token) if token else None
+
+    def _ensure_key(self) -> str:
+        if self.key is None:
+            # the only session write an anonymous cart ever needs
+            token = secrets.token_urlsafe(16)
+            self.session[CART_TOKEN_KEY] = token
+            self.key = token_cart_key(token)
+        return self.key
+
+    def _redis(self):
+        return None if is_degraded() else get_redis()
+
+    def _absorb_session(self, r) -> None:
+        """Move lines written to the session (older carts, degraded mode) into Redis."""
+        legacy = self.fallback.load()
+        if legacy:
+            merge_into(r, self._ensure_key(), legacy)
+            self.fallback.clear()
+
+    def load(self) -> Lines:
+        try:
+            r = self._redis()
+            if r is not None:
+                self._absorb_session(r)
+                return decode_hash(r.hgetall(self.key)) if self.key else {}
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        return self.fallback.load()
+
+    def _finish(self, pipe, key: str) -> None:
+        pipe.expire(key, CART_TTL)
+        pipe.sadd(DIRTY_KEY, key)
+        pipe.execute()
+
+    def add(self, pid: str, quantity: int, price: str) -> None:
+        try:
+            r = self._redis()
+            if r is not None:
+                key = self._ensure_key()
+                pipe = r.pipeline(transaction=True)
+                pipe.hincrby(key, f"q:{pid}", int(quantity))
+                pipe.hsetnx(key, f"p:{pid}", price)
+                pipe.hincrby(key, "n", int(quantity))
+                self._finish(pipe, key)
+                return
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        self.fallback.add(pid, quantity, price)
+
+    def _swap_line(self, pid: str, quantity: int, price: Optional[str]) -> bool:
+        """Set (or with price=None delete) one line and keep n in step."""
+        r = self._redis()
+        if r is None:
+            return False
+        key = self._ensure_key()
+
+        def update(pipe):
+            old = int(pipe.hget(key, f"q:{pid}") or 0)
+            pipe.multi()
+            if price is None:
+                pipe.hdel(key, f"q:{pid}", f"p:{pid}")
+                pipe.hincrby(key, "n", -old)
+            else:
+                pipe.hset(key, f"q:{pid}", int(quantity))
+                pipe.hsetnx(key, f"p:{pid}", price)
+                pipe.hincrby(key, "n", int(quantity) - old)
+            pipe.expire(key, CART_TTL)
+            pipe.sadd(DIRTY_KEY, key)
+
+        r.transaction(update, key)  # WATCH/MULTI, retried if the line changed meanwhile
+        return True
+
+    def set(self, pid: str, quantity: int, price: str) -> None:
+        try:
+            if self._swap_line(pid, quantity, price):
+                return
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        self.fallback.set(pid, quantity, price)
+
+    def remove(self, pid: str) -> None:
+        if self.key is None:
+            self.fallback.remove(pid)
+            return
+        try:
+            if self._swap_line(pid, 0, None):
+                self.fallback.remove(pid)
+                return
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        self.fallback.remove(pid)
+
+    def batch(self, ops: Iterable[tuple]) -> Lines:
+        """Apply several line operations in one WATCH/MULTI; returns the new lines."""
+        ops = list(ops)
+        try:
+            r = self._redis()
+            if r is not None:
+                self._absorb_session(r)
+                key = self._ensure_key()
+                result: Lines = {}
+
+                def update(pipe):
+                    before = decode_hash(pipe.hgetall(key))
+                    after = apply_ops(before, ops)
+                    pipe.multi()
+                    gone = [f for pid in before.keys() - after.keys() for f in (f"q:{pid}", f"p:{pid}")]
+                    if gone:
+                        pipe.hdel(key, *gone)
+                    fields = {}
+                    for pid, line in after.items():
+                        if before.get(pid) != line:
+                            fields[f"q:{pid}"] = line["quantity"]
+                            fields[f"p:{pid}"] = line["price"]
+                    fields["n"] = sum(line["quantity"] for line in after.values())
+                    pipe.hset(key, mapping=fields)
+                    pipe.expire(key, CART_TTL)
+                    pipe.sadd(DIRTY_KEY, key)
+                    result.clear()
+                    result.update(after)
+
+                r.transaction(update, key)
+                return result
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        return self.fallback.batch(ops)
+
+    def replace(self, lines: Lines) -> None:
+        try:
+            r = self._redis()
+            if r is not None:
+                key = self._ensure_key()
+                pipe = r.pipeline(transaction=True)
+                pipe.delete(key)
+                for pid, line in lines.items():
+                    pipe.hset(key, mapping={f"q:{pid}": int(line["quantity"]), f"p:{pid}": str(line["price"])})
+                pipe.hset(key, "n", sum(int(line["quantity"]) for line in lines.values()))
+                self._finish(pipe, key)
+                return
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        self.fallback.replace(lines)
+
+    def clear(self) -> None:
+        if self.fallback.load():
+            self.fallback.clear()
+        if self.key is None:
+            return
+        try:
+            r = self._redis()
+            if r is not None:
+                pipe = r.pipeline(transaction=True)
+                pipe.delete(self.key)
+                pipe.sadd(DIRTY_KEY, self.key)
+                pipe.execute()
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+
+    def count(self) -> int:
+        pending = self.fallback.count()  # lines not yet moved into Redis
+        if self.key is None:
+            return pending
+        try:
+            r = self._redis()
+            if r is not None:
+                return int(r.hget(self.key, "n") or 0) + pending
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+        return pending
+
+
+def get_storage(request):
+    """The configured backend for this request (settings.CART_STORAGE)."""
+    path = getattr(settings, "CART_STORAGE", "cart.storage.SessionCartStorage")
+    return import_string(path)(request)
+
+
+# ---------------------------------------------------------------------------
+# Background persistence
+# ---------------------------------------------------------------------------
+def _snapshot_items(lines: Lines, names: Dict[int, str]) -> List[dict]:
+    return [
+        {"product_id": int(pid), "name": names.get(int(pid), "Item"), "qty": line["quantity"], "price": line["price"]}
+        for pid, line in lines.items()
+    ]
+
+
+def persist_carts(batch_size: int = 500) -> int:
+    """
+    Copy carts changed since the last run from Redis to CartSnapshot.
+    Returns the number of carts written or deleted.
+    """
+    from django.contrib.auth import get_user_model
+
+    from shop.models import Product
+    from .models import CartSnapshot
+
+    if is_degraded():
+        return 0
+    done = 0
+    try:
+        r = get_redis()
+        while True:
+            keys = [_s(k) for k in r.spop(DIRTY_KEY, batch_size) or []]
+            if not keys:
+                break
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            carts = {key: decode_hash(raw) for key, raw in zip(keys, pipe.execute())}
+            try:
+                done += _write_snapshots(carts, Product, CartSnapshot, get_user_model())
+            except Exception:
+                r.sadd(DIRTY_KEY, *keys)  # retried on the next run
+                raise
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+    return done
+
+
+def _write_snapshots(carts: Dict[str, Lines], Product, CartSnapshot, User) -> int:
+    pids = {int(pid) for lines in carts.values() for pid in lines}
+    names = dict(Product.objects.filter(id__in=pids).values_list("id", "name")) if pids else {}
+    user_ids = {int(key.rsplit(":", 1)[1]) for key in carts if key.startswith("cart:u:")}
+    emails = dict(User.objects.filter(id__in=user_ids).values_list("id", "email")) if user_ids else {}
+
+    empty = [key for key, lines in carts.items() if not lines]
+    if empty:
+        CartSnapshot.objects.filter(key__in=empty).delete()
+    rows = []
+    for key, lines in carts.items():
+        if not lines:
+            continue
+        user_id = int(key.rsplit(":", 1)[1]) if key.startswith("cart:u:") else None
+        if user_id is not None and user_id not in emails:
+            continue  # user deleted
+        rows.append(CartSnapshot(
+            key=key, user_id=user_id, email=emails.get(user_id, "") or "",
+            data={"items": _snapshot_items(lines, names)},
+        ))
+    CartSnapshot.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=["key"], update_fields=["user", "email", "data", "updated"],
+    )
+    return len(carts)
+
+
+def restore_lines(snapshot_data: dict) -> Lines:
+    return {
+        str(item["product_id"]): {"quantity": int(item.get("qty", 1)), "price": str(item.get("price", "0"))}
+        for item in snapshot_data.get("items", [])
+        if item.get("product_id")
+    }
+
+
+def merge_anonymous_cart(request, user) -> None:
+    """At login: fold the visitor's cart into the user's (restoring it from the DB if Redis lost it)."""
+    from .models import CartSnapshot
+
+    token = request.session.get(CART_TOKEN_KEY)
+    if is_degraded():
+        return  # the token stays in the session; merged at the next login
+    try:
+        r = get_redis()
+        key = user_cart_key(user.pk)
+        if not r.exists(key):
+            snap = CartSnapshot.objects.filter(key=key).only("data").first()
+            if snap is not None:
+                merge_into(r, key, restore_lines(snap.data))
+        if token:
+            anon = token_cart_key(token)
+            lines = decode_hash(r.hgetall(anon))
+            if lines:
+                merge_into(r, key, lines)
+            pipe = r.pipeline(transaction=True)
+            pipe.delete(anon)
+            pipe.sadd(DIRTY_KEY, anon)
+            pipe.execute()
+            request.session.pop(CART_TOKEN_KEY, None)
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
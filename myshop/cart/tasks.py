@@ -0,0 +1,10 @@
+# cart/tasks.py
+from celery import shared_task
+
+from .storage import persist_carts
+
+
+@shared_task(ignore_result=True)
+def persist_cart_snapshots():
+    """Copy carts changed in Redis to CartSnapshot (schedule every minute or so)."""
+    persist_carts()
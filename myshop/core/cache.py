@@ -0,0 +1,72 @@
+# core/cache.py
+"""
+Shared Django cache backend.
+
+Everything that coordinates processes through the cache (rerank results and
+their generation, GraphQL persisted queries, the facet index version, the
+category tree, coupon lookups) needs one cache seen by every web and Celery
+process; LocMemCache would give each process its own copy.
+
+DegradingRedisCache is Django's RedisCache that treats an unreachable Redis
+like a cache miss, using the same degraded window as core.redis_client: reads
+return the default, writes are dropped, and no call waits on a dead server
+for longer than the socket timeout.
+"""
+from __future__ import annotations
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .redis_client import REDIS_ERRORS, is_degraded, mark_degraded
+
+
+def is_process_local(cache) -> bool:
+    """True if entries written by one process are invisible to the others."""
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+class DegradingRedisCache(RedisCache):
+    def _call(self, fallback, method, *args, **kwargs):
+        if is_degraded():
+            return fallback
+        try:
+            return getattr(super(), method)(*args, **kwargs)
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+            return fallback
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(False, "add", key, value, timeout, version)
+
+    def get(self, key, default=None, version=None):
+        return self._call(default, "get", key, default, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(None, "set", key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(False, "touch", key, timeout, version)
+
+    def delete(self, key, version=None):
+        return self._call(False, "delete", key, version)
+
+    def get_many(self, keys, version=None):
+        return self._call({}, "get_many", keys, version)
+
+    def has_key(self, key, version=None):
+        return self._call(False, "has_key", key, version)
+
+    def incr(self, key, delta=1, version=None):
+        # a missing key still raises ValueError, as callers expect
+        return self._call(0, "incr", key, delta, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(list(data), "set_many", data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        return self._call(None, "delete_many", keys, version)
+
+    def clear(self):
+        return self._call(False, "clear")
@@ -0,0 +1,107 @@
+# core/redis_client.py
+"""
+Shared Redis client for the recommender and cart code.
+
+The client is created on first use (importing this module opens nothing) and
+draws from one bounded, blocking connection pool per process. Callers that can
+live without Redis check `is_degraded()` first and call `mark_degraded()` when a
+command fails, so a slow or dead Redis is skipped for a cooldown window instead
+of blocking every request on socket timeouts. Waiting too long for a pooled
+connection raises PoolExhausted, which callers handle like any Redis error but
+which does not start the cooldown.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+_logger = logging.getLogger(__name__)
+
+# Errors that mean "Redis is unreachable/slow", as opposed to bad commands.
+REDIS_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+
+class PoolExhausted(redis.exceptions.ConnectionError):
+    """Every pooled connection stayed busy for REDIS_POOL_TIMEOUT; Redis itself may be fine."""
+
+
+class _BlockingPool(redis.BlockingConnectionPool):
+    def get_connection(self, *args, **kwargs):
+        try:
+            return super().get_connection(*args, **kwargs)
+        except redis.exceptions.ConnectionError as e:
+            # redis-py raises a bare ConnectionError when the pool wait times out
+            if type(e) is redis.exceptions.ConnectionError and str(e) == "No connection available.":
+                raise PoolExhausted(str(e)) from e
+            raise
+
+
+_lock = threading.Lock()
+_client: redis.Redis | None = None
+_degraded_until: float = 0.0
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def get_redis() -> redis.Redis:
+    """Return the process-wide client, building its connection pool on first call."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                pool = _BlockingPool(
+                    host=_setting("REDIS_HOST", "127.0.0.1"),
+                    port=_setting("REDIS_PORT", 6379),
+                    db=_setting("REDIS_DB", 0),
+                    max_connections=_setting("REDIS_MAX_CONNECTIONS", 20),
+                    # how long a request waits for a free pooled connection
+                    timeout=_setting("REDIS_POOL_TIMEOUT", 0.5),
+                    socket_timeout=_setting("REDIS_SOCKET_TIMEOUT", 0.25),
+                    socket_connect_timeout=_setting("REDIS_CONNECT_TIMEOUT", 0.25),
+                    health_check_interval=_setting("REDIS_HEALTH_CHECK_INTERVAL", 30),
+                )
+                _client = redis.Redis(connection_pool=pool)
+    return _client
+
+
+def reset_redis() -> None:
+    """Drop the pool (e.g. after fork) so the next call reconnects."""
+    global _client, _degraded_until
+    with _lock:
+        if _client is not None:
+            _client.connection_pool.disconnect()
+        _client = None
+        _degraded_until = 0.0
+
+
+def is_degraded() -> bool:
+    """True while Redis is being skipped after a recent failure."""
+    return time.monotonic() < _degraded_until
+
+
+def mark_degraded(exc: Exception | None = None) -> None:
+    """Skip Redis for REDIS_DEGRADED_COOLDOWN seconds after a failure."""
+    global _degraded_until
+    if isinstance(exc, PoolExhausted):
+        # a burst of concurrent callers, not a dead server: fail this call
+        # over to the fallback but keep using Redis for the next one
+        _logger.warning("Redis pool exhausted; not degrading: %s", exc)
+        return
+    cooldown = float(_setting("REDIS_DEGRADED_COOLDOWN", 30))
+    _degraded_until = time.monotonic() + cooldown
+    _logger.warning("Redis unavailable; degraded for %.0fs: %s", cooldown, exc)
+
+
+def ping() -> bool:
+    """Health check: True if Redis answers, marking degraded mode otherwise."""
+    try:
+        return bool(get_redis().ping())
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+        return False
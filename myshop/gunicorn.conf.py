@@ -0,0 +1,8 @@
+# gunicorn.conf.py (read from the working directory by `gunicorn myshop.wsgi:application`)
+
+
+def post_fork(server, worker):
+    # with --preload the app (and any Redis pool it opened) is built in the
+    # master; give every worker its own connections
+    from core.redis_client import reset_redis
+    reset_redis()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from cart.cart import Cart
 from shop.models import Product
@@ -25,6 +26,22 @@ class CouponInSerializer(serializers.Serializer):
     code = serializers.CharField()
 
 
+class CartOpInSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=["add", "set", "remove"])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False, default=1)
+
+
+class CartBatchInSerializer(serializers.Serializer):
+    ops = CartOpInSerializer(many=True, allow_empty=False)
+
+    def validate_ops(self, ops):
+        limit = getattr(settings, "CART_BATCH_MAX_OPS", 100)
+        if len(ops) > limit:
+            raise serializers.ValidationError(f"At most {limit} operations per request.")
+        return ops
+
+
 # ----------------------
 # OUTPUT SERIALIZERS
 # ----------------------
@@ -2,6 +2,26 @@
 from rest_framework import serializers
 from shop.models import Product, Category, SubCategory  # adjust if your model names differ
 
+
+def requested_fields(request):
+    """Field names from ?fields=a,b,c (None when the param is absent/empty)."""
+    raw = request.query_params.get("fields") if request is not None else None
+    if not raw:
+        return None
+    return {f.strip() for f in raw.split(",") if f.strip()}
+
+
+class SparseFieldsetMixin:
+    """Drop every field not listed in ?fields= (unknown names are ignored)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get("request"))
+        if wanted:
+            for name in set(self.fields) - wanted - {"id"}:
+                self.fields.pop(name)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -12,7 +32,7 @@ class SubCategorySerializer(serializers.ModelSerializer):
         model = SubCategory
         fields = ["id", "name", "slug"]
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # Show nested category info (read-only). If you don’t want nested, remove this override.
     category = CategorySerializer(read_only=True)
 
@@ -10,10 +10,11 @@ from .views_checkout import CreateCheckoutSessionView, FinalizeCheckoutView
 from .views_products import (
     ProductListAPIView,
     ProductDetailAPIView,
+    ProductSearchAPIView,
     CategoryViewSet,
     SubCategoryViewSet,
 )
-from .views_cart import CartView, CartItemView, CouponView, CartCountView
+from .views_cart import CartView, CartItemView, CartBatchView, CouponView, CartCountView
 from .views_content import MarketingImageViewSet
 
 # ✅ import from framework (this app), not orders.views
@@ -52,11 +53,13 @@ urlpatterns = [
 
     # ---------- Products ----------
     path("products/", ProductListAPIView.as_view(), name="product-list"),
+    path("products/search/", ProductSearchAPIView.as_view(), name="product-search"),
     path("products/<int:pk>/", ProductDetailAPIView.as_view(), name="product-detail"),
 
     # ---------- Cart (session-based) ----------
     path("cart/", CartView.as_view(), name="api-cart"),
     path("cart/item/", CartItemView.as_view(), name="api-cart-item"),
+    path("cart/batch/", CartBatchView.as_view(), name="api-cart-batch"),
     path("cart/coupon/", CouponView.as_view(), name="api-cart-coupon"),
     path("cart/count/", CartCountView.as_view(), name="api-cart-count"),
 
@@ -1,12 +1,15 @@
 from decimal import Decimal
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.exceptions import ValidationError
 
-from cart.cart import Cart as SessionCart
+from cart.cart import Cart as SessionCart, cart_count
+from .serializers_cart import CartBatchInSerializer
 from shop.models import Product
 
 # ---- Optional coupon model import (handle if app not installed) ----
@@ -24,36 +27,46 @@ def _abs_media(u: str) -> str:
     u = str(u)
     return u if u.startswith("http") else f"{DJANGO_BASE}{u if u.startswith('/') else '/' + u}"
 
-def _cart_payload(c: SessionCart) -> dict:
-    items = []
-    qty_total = 0
-    for it in c:
-        p = it["product"]
-        q = int(it.get("quantity", 0))
-        qty_total += q
-        items.append({
-            "product_id": p.id,
-            "name": getattr(p, "name", f"Product {p.id}"),
-            "quantity": q,
-            "price": str(it["price"]),                 # Decimal -> str
-            "line_total": str(it["total_price"]),
-            "product_image": _abs_media(getattr(p, "image", "") or getattr(p, "image_url", "")),
-            "slug": getattr(p, "slug", ""),
-        })
+def _cart_payload(c: SessionCart, summary: bool = False) -> dict:
+    """Cart response; summary=True leaves out items, so no product query is made."""
+    pricing = c.pricing()  # subtotal -> coupon -> shipping -> tax, computed once
     data = {
-        "items": items,
-        "subtotal": str(c.get_total_price()),
-        "discount": str(c.get_discount()),
-        "total": str(c.get_total_price_after_discount()),
+        "subtotal": str(pricing.subtotal),
+        "discount": str(pricing.discount),
+        "total": str(pricing.merchandise),
+        # estimate for the saved destination (standard shipping to the US by default)
+        "shipping": str(pricing.shipping),
+        "tax": str(pricing.tax),
+        "grand_total": str(pricing.grand_total),
         # Use total quantity for badges:
-        "count": qty_total,
-        "cart_count": qty_total,
+        "count": pricing.count,
+        "cart_count": pricing.count,
     }
-    if getattr(c, "coupon", None):
+    if not summary:
+        items = []
+        qty_total = 0
+        for it in c:
+            p = it["product"]
+            q = int(it.get("quantity", 0))
+            qty_total += q
+            items.append({
+                "product_id": p.id,
+                "name": getattr(p, "name", f"Product {p.id}"),
+                "quantity": q,
+                "price": str(it["price"]),                 # Decimal -> str
+                "line_total": str(it["total_price"]),
+                "product_image": _abs_media(getattr(p, "image", "") or getattr(p, "image_url", "")),
+                "slug": getattr(p, "slug", ""),
+            })
+        data["items"] = items
+        # lines whose product was deleted are not shown, so don't count them
+        data["count"] = data["cart_count"] = qty_total
+    coupon = c.coupon
+    if coupon:
         data["coupon"] = {
-            "id": c.coupon.id,
-            "code": c.coupon.code,
-            "discount": c.coupon.discount,  # %
+            "id": coupon.id,
+            "code": coupon.code,
+            "discount": coupon.discount,  # %
         }
     return data
 
@@ -62,7 +75,7 @@ class CartView(APIView):
     def get(self, request):
         return Response(_cart_payload(SessionCart(request)), headers={"Cache-Control":"no-store"})
     def delete(self, request):
-        c = SessionCart(request); c.clear(); request.session.modified = True
+        c = SessionCart(request); c.clear()
         return Response(_cart_payload(c), headers={"Cache-Control":"no-store"})
 
 class CartItemView(APIView):
@@ -72,7 +85,6 @@ class CartItemView(APIView):
         pid = request.data.get("product_id"); qty = int(request.data.get("quantity", 1))
         p = Product.objects.get(pk=pid)
         c.add(p, quantity=qty, override_quantity=False)
-        request.session.modified = True
         return Response(_cart_payload(c), headers={"Cache-Control":"no-store"})
 
     def patch(self, request):
@@ -80,7 +92,6 @@ class CartItemView(APIView):
         pid = request.data.get("product_id"); qty = int(request.data.get("quantity", 1))
         p = Product.objects.get(pk=pid)
         c.add(p, quantity=qty, override_quantity=True)
-        request.session.modified = True
         return Response(_cart_payload(c), headers={"Cache-Control":"no-store"})
 
     def delete(self, request):
@@ -88,29 +99,62 @@ class CartItemView(APIView):
         pid = request.data.get("product_id")
         p = Product.objects.get(pk=pid)
         c.remove(p)
-        request.session.modified = True
         return Response(_cart_payload(c), headers={"Cache-Control":"no-store"})
 
+class CartBatchView(APIView):
+    """
+    POST {"ops": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}
+    Applies every operation in order as one cart update (nothing is applied if any
+    product is unknown) with a single product query. ?summary=1 returns totals only.
+    """
+    permission_classes = [permissions.AllowAny]
+    def post(self, request):
+        ser = CartBatchInSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        ops = [(o["op"], o["product_id"], o["quantity"]) for o in ser.validated_data["ops"]]
+
+        wanted = {pid for op, pid, _ in ops if op != "remove"}
+        products = Product.objects.in_bulk(wanted) if wanted else {}
+        unknown = sorted(wanted - products.keys())
+        if unknown:
+            raise ValidationError({"ops": f"Unknown product ids: {unknown}"})
+
+        c = SessionCart(request)
+        c.apply(ops, products)
+        summary = request.query_params.get("summary") in ("1", "true")
+        return Response(_cart_payload(c, summary=summary), headers={"Cache-Control":"no-store"})
+
+# ---- badge polling: maintained count + conditional GET (304 when unchanged) ----
+def _request_count(request) -> int:
+    # read the cart once: the etag func and the view share this request
+    if not hasattr(request, "_cart_count"):
+        request._cart_count = cart_count(request)
+    return request._cart_count
+
+def _count_etag(request, *args, **kwargs):
+    return f'"cart-{_request_count(request)}"'
+
+# browsers may keep it but must revalidate; the session cookie varies it
+COUNT_CACHE_CONTROL = {"Cache-Control": "private, no-cache"}
+
+@method_decorator(condition(etag_func=_count_etag), name="get")
 class CartCountView(APIView):
     permission_classes = [permissions.AllowAny]
     def get(self, request):
-        cart = SessionCart(request)
-        total_qty = sum(item["quantity"] for item in cart)
-        return Response({"count": total_qty, "cart_count": total_qty}, headers={"Cache-Control":"no-store"})
+        total_qty = _request_count(request)
+        return Response({"count": total_qty, "cart_count": total_qty}, headers=COUNT_CACHE_CONTROL)
 
+@method_decorator(condition(etag_func=_count_etag), name="get")
 class CartSummary(APIView):
     permission_classes = [permissions.AllowAny]
     def get(self, request):
-        c = SessionCart(request)
-        return Response({"cart_count": sum(i["quantity"] for i in c)}, headers={"Cache-Control":"no-store"})
+        return Response({"cart_count": _request_count(request)}, headers=COUNT_CACHE_CONTROL)
 
 class AddToCart(APIView):
     permission_classes = [permissions.AllowAny]
     def post(self, request):
         # this is just an example; your real add lives in CartItemView.post
-        c = SessionCart(request)
-        cart_count = sum(i["quantity"] for i in c)
-        return Response({"ok": True, "cart_count": cart_count}, status=status.HTTP_200_OK, headers={"Cache-Control":"no-store"})
+        return Response({"ok": True, "cart_count": cart_count(request)}, status=status.HTTP_200_OK, headers={"Cache-Control":"no-store"})
 
 # -------- NEW: CouponView to match your urls.py import --------
 class CouponView(APIView):
@@ -1,25 +1,158 @@
 # my_rest_framework/views_products.py
 from rest_framework import generics, viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from shop.models import Product, Category, SubCategory
-from .serializers_products import ProductSerializer, CategorySerializer, SubCategorySerializer
+from shop.category_tree import get_tree
+from shop.facets import facet_filter, facet_match, wants_facets
+from shop.search import search_products
+from .serializers_products import (
+    ProductSerializer, CategorySerializer, SubCategorySerializer, requested_fields,
+)
 from rest_framework import permissions, generics
 
+
+class ProductCursorPagination(CursorPagination):
+    # name is unique and indexed, so every page is one index range scan
+    ordering = "name"
+    page_size = 48
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    # ?ordering= choices; ties on price fall back to the cursor offset
+    orderings = {
+        "name": ("name",),
+        "-created": ("-created",),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get("ordering"), (self.ordering,))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # A facet filter can match most of the catalogue; rather than filter
+        # on every matching id, pick the ids this page can contain from the
+        # index (the next page_size + 1 matches past the cursor, which only
+        # holds for name order).
+        match = getattr(view, "facet_match", None)
+        if match is not None:
+            index, mask = match
+            ids = None
+            if self.get_ordering(request, queryset, view) == ("name",):
+                cursor = self.decode_cursor(request)
+                offset, reverse, position = cursor or (0, False, None)
+                size = self.get_page_size(request)
+                ids = index.window(mask, offset + size + 1, after=position, reverse=reverse)
+            queryset = queryset.filter(id__in=index.ids_in(mask) if ids is None else ids)
+        return super().paginate_queryset(queryset, request, view)
+
+
+def product_queryset(request):
+    """Load only the relations the response will serialise (all by default)."""
+    qs = Product.objects.all()
+    wanted = requested_fields(request)
+    if wanted is None or "category" in wanted:
+        qs = qs.select_related("category")
+    m2m = [f for f in ("colors", "sizes") if wanted is None or f in wanted]
+    if m2m:
+        qs = qs.prefetch_related(*m2m)
+    return qs
+
+
 class ProductListAPIView(generics.ListAPIView):
-    queryset = Product.objects.all()
+    """
+    GET ?cursor=&page_size=&fields=id,name,price&ordering=name|-created|price|-price
+    — constant queries per page.
+    Facets: ?color=1,2&size=3&brand=..&material=..&category=..&price=10-20
+    &price_min=&price_max= (comma = any of) filter the list, and the response
+    then carries "facets" counts from the precomputed index (shop/facets.py);
+    ?facets=1 returns counts without filtering.
+    """
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
     permission_classes = [permissions.AllowAny]  # 👈 public
 
+    def get_queryset(self):
+        self.facets = self.facet_match = None
+        if wants_facets(self.request.query_params):
+            index, mask, self.facets = facet_match(self.request.query_params)
+            if mask is not None:
+                # ProductCursorPagination narrows the page to matches
+                self.facet_match = (index, mask)
+        return product_queryset(self.request)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.facets is not None:
+            response.data["facets"] = self.facets
+        return response
+
 
 class ProductDetailAPIView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]  # 👈 public
 
+    def get_queryset(self):
+        return product_queryset(self.request)
+
+
+class ProductSearchAPIView(APIView):
+    """
+    GET /api/products/search/?q=wool sock&limit=24&offset=0&fields=...
+    Ranked full-text search with category/brand facet counts for all matches.
+    """
+    permission_classes = [permissions.AllowAny]
+    default_limit = 24
+    max_limit = 100
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", self.default_limit)), self.max_limit))
+            offset = max(0, int(request.query_params.get("offset", 0)))
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers."}, status=400)
+
+        result = search_products(query)
+        ids, facets = result.ids, result.facets
+        if wants_facets(request.query_params):
+            # narrow the ranked matches with the facet filters, keeping rank order
+            keep, facets = facet_filter(request.query_params, ids=ids)
+            keep = set(keep)
+            ids = [pid for pid in ids if pid in keep]
+
+        page_ids = ids[offset:offset + limit]
+        by_id = product_queryset(request).in_bulk(page_ids)
+        products = [by_id[pid] for pid in page_ids if pid in by_id]
+        return Response({
+            "query": query,
+            "count": len(ids),
+            "results": ProductSerializer(products, many=True, context={"request": request}).data,
+            "facets": facets,
+        })
+
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    @action(detail=False, methods=["get"])
+    def tree(self, request):
+        """GET /api/categories/tree/ — the whole nested tree from cache."""
+        return Response(get_tree())
+
+    @action(detail=True, methods=["get"])
+    def products(self, request, pk=None):
+        """GET /api/categories/<id>/products/ — this category and all descendants."""
+        category = self.get_object()
+        qs = product_queryset(request).in_category(category)
+        paginator = ProductCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        data = ProductSerializer(page, many=True, context={"request": request}).data
+        return paginator.get_paginated_response(data)
+
 class SubCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializer
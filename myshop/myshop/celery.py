@@ -1,8 +1,15 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myshop.settings')
 app = Celery('myshop')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_process_init.connect
+def _reset_redis(**kwargs):
+    # prefork pool children inherit the parent's Redis sockets; reconnect
+    from core.redis_client import reset_redis
+    reset_redis()
@@ -213,11 +213,15 @@ CSRF_COOKIE_SECURE = not DEBUG
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 7  # 7 days
-SESSION_SAVE_EVERY_REQUEST = True
+# Off: with carts in Redis, reads no longer need to rewrite the session row
+SESSION_SAVE_EVERY_REQUEST = config("SESSION_SAVE_EVERY_REQUEST", cast=bool, default=False)
 SESSION_SERIALIZER = "django.contrib.sessions.serializers.JSONSerializer"
 
 
 CART_SESSION_ID = "cart"
+# cart.storage.RedisCartStorage (Redis hashes) or cart.storage.SessionCartStorage
+CART_STORAGE = config("CART_STORAGE", default="cart.storage.RedisCartStorage")
+CART_REDIS_TTL = config("CART_REDIS_TTL", cast=int, default=30 * 24 * 3600)
 
 
 # --------------------------------------------------------------------------------------
@@ -266,11 +270,27 @@ STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY", default="")
 STRIPE_API_VERSION = config("STRIPE_API_VERSION", default="2024-04-10")
 STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET", default="")
 
-GRAPHENE = {"SCHEMA": "recommender.schema.schema"}
+GRAPHENE = {
+    "SCHEMA": "recommender.schema.schema",
+    "MIDDLEWARE": ["recommender.graphql_view.TimingMiddleware"],
+}
+# Guard rails for /graphql (see recommender/graphql_view.py)
+GRAPHQL_MAX_DEPTH = config("GRAPHQL_MAX_DEPTH", cast=int, default=8)
+GRAPHQL_MAX_COST = config("GRAPHQL_MAX_COST", cast=int, default=1000)
+GRAPHQL_SLOW_MS = config("GRAPHQL_SLOW_MS", cast=float, default=200)
+GRAPHQL_GRAPHIQL = config("GRAPHQL_GRAPHIQL", cast=bool, default=DEBUG)
 
 OLLAMA_HOST = config("OLLAMA_HOST", default="http://127.0.0.1:11434")
 OLLAMA_MODEL = config("OLLAMA_MODEL", default="llama3:8b-instruct-q4_0")
 OLLAMA_TIMEOUT = config("OLLAMA_TIMEOUT", cast=int, default=12)
+RERANK_CACHE_TTL = config("RERANK_CACHE_TTL", cast=int, default=3600)
+# Serve baseline recommendations and rerank on Celery (needs a running worker)
+RERANK_ASYNC = config("RERANK_ASYNC", cast=bool, default=False)
+
+# Collaborative filtering model for /api/recommend/ (build_cf_model)
+RECOMMENDATION_MODEL_PATH = config("RECOMMENDATION_MODEL_PATH", default=str(BASE_DIR / "cf_model.npz"))
+# TF-IDF state kept by build_recs between runs (delta runs reuse it)
+SIMILARITY_TFIDF_PATH = config("SIMILARITY_TFIDF_PATH", default=str(BASE_DIR / "tfidf_state.npz"))
 
 SITE_NAME = config("SITE_NAME", default="Candle Shop")
 SITE_DOMAIN = config("SITE_DOMAIN", default="sockcs.com")
@@ -307,6 +327,27 @@ REDIS_HOST = '127.0.0.1'
 REDIS_PORT = 6379          
 REDIS_DB   = 0   # <--- add this line
 
+# Shared pooled client (core/redis_client.py): bounded per process, fail fast
+REDIS_MAX_CONNECTIONS = config("REDIS_MAX_CONNECTIONS", cast=int, default=20)
+REDIS_POOL_TIMEOUT = config("REDIS_POOL_TIMEOUT", cast=float, default=0.5)
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", cast=float, default=0.25)
+REDIS_CONNECT_TIMEOUT = config("REDIS_CONNECT_TIMEOUT", cast=float, default=0.25)
+REDIS_HEALTH_CHECK_INTERVAL = config("REDIS_HEALTH_CHECK_INTERVAL", cast=int, default=30)
+REDIS_DEGRADED_COOLDOWN = config("REDIS_DEGRADED_COOLDOWN", cast=int, default=30)
+
+# One cache for every web/Celery process (rerank results, persisted GraphQL
+# queries, facet/category versions). An unreachable Redis reads as a miss.
+CACHES = {
+    "default": {
+        "BACKEND": "core.cache.DegradingRedisCache",
+        "LOCATION": config("CACHE_REDIS_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"),
+        "OPTIONS": {
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        },
+    }
+}
+
 
 TAX_RATES = {
     # Your originals
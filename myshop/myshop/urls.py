@@ -6,7 +6,7 @@ from django.urls import include, path
 from django.conf.urls.i18n import i18n_patterns
 from django.views.decorators.csrf import csrf_exempt
 
-from graphene_django.views import GraphQLView
+from recommender.graphql_view import ShopGraphQLView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from .views import csrf_view
@@ -53,6 +53,7 @@ api_patterns = [
     path("api/", include("shop.urls")),                # products, banners, marketing-images, etc.
     path("api/", include("support.urls")),             # enquiries (router-based public/admin as defined)
     path("api/recommend/", include("recommendation.urls")),
+    path("api/recommendations/", include("recommender.urls")),
 
     # ---------- Auth & session ----------
     path("api/accounts/", include("accounts.urls")),   # register/login/logout etc.
@@ -107,7 +108,7 @@ urlpatterns += i18n_patterns(
     path("coupons/", include(("coupons.urls", "coupons"), namespace="coupons")),
     path("rosetta/", include("rosetta.urls")),
     path("accounts/", include("accounts.urls")),
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql", csrf_exempt(ShopGraphQLView.as_view(graphiql=settings.GRAPHQL_GRAPHIQL))),
 )
 
 # Media (dev)
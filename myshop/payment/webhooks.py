@@ -1,9 +1,9 @@
 import stripe
+from core.redis_client import REDIS_ERRORS, mark_degraded
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from orders.models import Order
-from shop.models import Product
 from shop.recommender import Recommender
 
 from .tasks import payment_completed
@@ -47,10 +47,13 @@ def stripe_webhook(request):
             order.save()
 
             # save items bought for product recommendations
-            product_ids = order.items.values_list('product_id')
-            products = Product.objects.filter(id__in=product_ids)
+            product_ids = order.items.values_list('product_id', flat=True)
             r = Recommender()
-            r.products_bought(products)
+            try:
+                r.bulk_products_bought([list(product_ids)])
+            except REDIS_ERRORS as e:
+                # recommendations can be rebuilt with replay_purchases
+                mark_degraded(e)
 
             # launch asynchronous task
             payment_completed.delay(order.id)
@@ -0,0 +1,181 @@
+# recommendation/engine.py
+"""
+Item-item collaborative filtering for /api/recommend/.
+
+`build_model()` streams order lines into a sparse customers x products matrix
+(customers are order e-mails; Order has no user FK), derives cosine item-item
+neighbours and saves everything to one .npz file. `get_model()` keeps the
+loaded model in memory (reloaded when the file changes), so a query is a few
+sparse row operations instead of chained OrderItem aggregates.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models.functions import Lower
+from scipy import sparse
+
+_logger = logging.getLogger(__name__)
+
+MODEL_PATH: str = str(getattr(settings, "RECOMMENDATION_MODEL_PATH", "cf_model.npz"))
+NEIGHBOURS: int = int(getattr(settings, "RECOMMENDATION_NEIGHBOURS", 50))
+
+
+class CFModel:
+    def __init__(self, item_ids, user_keys, interactions, similarity, catalogue_ids):
+        self.item_ids: np.ndarray = item_ids                    # column -> product id
+        self.user_row = {k: i for i, k in enumerate(user_keys)}  # e-mail -> row
+        self.interactions: sparse.csr_matrix = interactions      # users x items (0/1)
+        self.similarity: sparse.csr_matrix = similarity          # items x items, top-K per row
+        self.catalogue_ids: np.ndarray = catalogue_ids           # available products (cold start)
+
+    def recommend(self, email: str, n: int = 5) -> List[int]:
+        """Top-n product ids for the customer, [] if they have no history."""
+        row = self.user_row.get((email or "").lower())
+        if row is None:
+            return []
+        seen = self.interactions[row].indices
+        if not len(seen):
+            return []
+        scores = np.asarray(self.similarity[seen].sum(axis=0)).ravel()
+        scores[seen] = 0.0
+        k = min(n, int((scores > 0).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.item_ids[top].tolist()
+
+    def random_sample(self, n: int = 3) -> List[int]:
+        """
+        Cheap cold-start sample of available products (no ORDER BY RANDOM()).
+        catalogue_ids is as of the last build, so availability is re-checked
+        now on a few extra picks (one primary-key query).
+        """
+        from shop.models import Product
+
+        ids = self.catalogue_ids
+        if not len(ids):
+            return []
+        picks = np.random.default_rng().choice(ids, size=min(n * 4, len(ids)), replace=False).tolist()
+        live = set(Product.objects.filter(id__in=picks, available=True).values_list("id", flat=True))
+        return [pid for pid in picks if pid in live][:n]
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            item_ids=self.item_ids,
+            user_keys=np.array(list(self.user_row), dtype=str),
+            r_data=self.interactions.data, r_indices=self.interactions.indices,
+            r_indptr=self.interactions.indptr, r_shape=self.interactions.shape,
+            s_data=self.similarity.data, s_indices=self.similarity.indices,
+            s_indptr=self.similarity.indptr, s_shape=self.similarity.shape,
+            catalogue_ids=self.catalogue_ids,
+        )
+        os.replace(tmp, path)  # readers never see a half-written model
+
+    @classmethod
+    def load(cls, path: str) -> "CFModel":
+        with np.load(path) as z:
+            R = sparse.csr_matrix((z["r_data"], z["r_indices"], z["r_indptr"]), shape=tuple(z["r_shape"]))
+            S = sparse.csr_matrix((z["s_data"], z["s_indices"], z["s_indptr"]), shape=tuple(z["s_shape"]))
+            return cls(z["item_ids"], z["user_keys"].tolist(), R, S, z["catalogue_ids"])
+
+
+def _top_k_rows(m: sparse.csr_matrix, k: int) -> sparse.csr_matrix:
+    """Keep the k largest entries of every row."""
+    m = m.tocsr()
+    rows, cols, vals = [], [], []
+    for i in range(m.shape[0]):
+        start, end = m.indptr[i], m.indptr[i + 1]
+        if start == end:
+            continue
+        data = m.data[start:end]
+        idx = m.indices[start:end]
+        if len(data) > k:
+            keep = np.argpartition(-data, k - 1)[:k]
+            data, idx = data[keep], idx[keep]
+        rows.append(np.full(len(data), i))
+        cols.append(idx)
+        vals.append(data)
+    if not rows:
+        return sparse.csr_matrix(m.shape, dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=m.shape
+    )
+
+
+def build_model(path: str = MODEL_PATH, *, neighbours: int = NEIGHBOURS) -> CFModel:
+    """Build the item-item model from order history and save it to `path`."""
+    from orders.models import OrderItem
+    from shop.models import Product
+
+    item_ids = np.fromiter(Product.objects.order_by("id").values_list("id", flat=True), dtype=np.int64)
+    col = {int(pid): i for i, pid in enumerate(item_ids)}
+    catalogue_ids = np.fromiter(
+        Product.objects.filter(available=True).values_list("id", flat=True), dtype=np.int64
+    )
+
+    user_row: dict = {}
+    rows, cols = [], []
+    lines = (
+        OrderItem.objects
+        .annotate(email=Lower("order__email"))
+        .values_list("email", "product_id")
+        .iterator(chunk_size=10_000)
+    )
+    for email, pid in lines:
+        c = col.get(pid)
+        if c is None or not email:
+            continue
+        rows.append(user_row.setdefault(email, len(user_row)))
+        cols.append(c)
+
+    R = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(user_row), len(item_ids)),
+    )
+    R.data[:] = 1.0  # bought at all, not how often
+
+    # cosine between item columns: co-buyers / sqrt(buyers_i * buyers_j)
+    co = (R.T @ R).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
+    norms = np.sqrt(np.asarray(R.sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    inv = sparse.diags(1.0 / norms)
+    S = _top_k_rows((inv @ co @ inv).astype(np.float32), neighbours)
+
+    model = CFModel(item_ids, list(user_row), R, S, catalogue_ids)
+    model.save(path)
+    return model
+
+
+_lock = threading.Lock()
+_loaded: Optional[CFModel] = None
+_loaded_mtime: float = 0.0
+
+
+def get_model(path: str = MODEL_PATH) -> Optional[CFModel]:
+    """In-memory model, reloaded when the file on disk changes; None if never built."""
+    global _loaded, _loaded_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _loaded is None or mtime != _loaded_mtime:
+        with _lock:
+            if _loaded is None or mtime != _loaded_mtime:
+                try:
+                    _loaded = CFModel.load(path)
+                    _loaded_mtime = mtime
+                except Exception as e:
+                    _logger.warning("Could not load CF model from %s: %s", path, e)
+    return _loaded
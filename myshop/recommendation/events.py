@@ -0,0 +1,205 @@
+# recommendation/events.py
+"""
+Buffered ingestion for UserInteraction.
+
+`log_interaction()` only appends the event to a Redis stream (or, while Redis
+is degraded, to a bounded in-process buffer), so request handlers never wait
+on a DB insert. `flush_interactions()` drains the stream in batches with
+bulk_create and folds the same batch into the InteractionDaily rollups.
+
+The in-process buffer is only visible to the process that filled it. Web
+processes hand it back to the stream after a response once Redis answers
+again (signals.py), so requests never write interactions to the DB; workers
+write theirs at the start of every flush.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.redis_client import REDIS_ERRORS, get_redis, is_degraded, mark_degraded
+
+from .models import InteractionDaily, UserInteraction
+
+_logger = logging.getLogger(__name__)
+
+STREAM_KEY = "recs:interactions"
+LOCK_KEY = "recs:interactions:flush-lock"
+STREAM_MAXLEN: int = int(getattr(settings, "INTERACTION_STREAM_MAXLEN", 1_000_000))
+LOCAL_MAXLEN: int = int(getattr(settings, "INTERACTION_LOCAL_MAXLEN", 10_000))
+ACTIONS = {a for a, _ in UserInteraction.ACTIONS}
+
+# fallback while Redis is unavailable (per process, oldest events dropped first)
+_local: deque = deque(maxlen=LOCAL_MAXLEN)
+_local_lock = threading.Lock()
+
+# delete the flush lock only if it still holds our token; once it has expired
+# and another flusher took it, a plain DEL would release *their* lock
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_release_script = None
+
+
+def log_interaction(user_id, product_id, action: str, when: datetime | None = None) -> bool:
+    """Queue one event. Returns False if it was rejected as invalid."""
+    if action not in ACTIONS or not product_id:
+        return False
+    event = {
+        "u": str(user_id or "")[:50],
+        "p": str(int(product_id)),
+        "a": action,
+        "t": str((when or timezone.now()).timestamp()),
+    }
+    if not is_degraded():
+        try:
+            get_redis().xadd(STREAM_KEY, event, maxlen=STREAM_MAXLEN, approximate=True)
+            return True
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+    with _local_lock:
+        _local.append(event)
+    return True
+
+
+def _decode(raw: dict) -> dict:
+    return {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in raw.items()
+    }
+
+
+def _store(events: Iterable[dict]) -> int:
+    """bulk_create the raw rows and add their counts to the daily rollups."""
+    rows: List[UserInteraction] = []
+    rollup: Counter = Counter()
+    for ev in events:
+        try:
+            ts = datetime.fromtimestamp(float(ev["t"]), tz=dt_timezone.utc)
+            pid = int(ev["p"])
+        except (KeyError, ValueError):
+            continue
+        if ev.get("a") not in ACTIONS:
+            continue
+        rows.append(UserInteraction(user_id=ev.get("u", ""), product_id=pid, action=ev["a"], timestamp=ts))
+        rollup[(pid, ts.date(), ev["a"])] += 1
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        # product ids come from clients; drop events for products that do not exist
+        from shop.models import Product
+        known = set(Product.objects.filter(id__in={r.product_id for r in rows}).values_list("id", flat=True))
+        rows = [r for r in rows if r.product_id in known]
+        UserInteraction.objects.bulk_create(rows, batch_size=2000)
+
+        # add the batch's counts to the rows that already exist (locked until
+        # commit), then write every rollup row back in one upsert
+        rollup = Counter({key: n for key, n in rollup.items() if key[0] in known})
+        if rollup:
+            existing = (
+                InteractionDaily.objects.select_for_update()
+                .filter(product_id__in={p for p, _, _ in rollup}, day__in={d for _, d, _ in rollup})
+                .values_list("product_id", "day", "action", "count")
+            )
+            for p, d, a, n in existing:
+                if (p, d, a) in rollup:
+                    rollup[(p, d, a)] += n
+            InteractionDaily.objects.bulk_create(
+                [InteractionDaily(product_id=p, day=d, action=a, count=n) for (p, d, a), n in rollup.items()],
+                batch_size=2000,
+                update_conflicts=True,
+                unique_fields=["product", "day", "action"],
+                update_fields=["count"],
+            )
+    return len(rows)
+
+
+def _take_local(batch_size: int) -> List[dict]:
+    with _local_lock:
+        return [_local.popleft() for _ in range(min(batch_size, len(_local)))]
+
+
+def _put_back_local(events: List[dict]) -> None:
+    with _local_lock:
+        _local.extendleft(reversed(events))
+
+
+def drain_local(batch_size: int = 1000) -> int:
+    """Write up to `batch_size` events from this process's fallback buffer."""
+    if not _local:
+        return 0
+    events = _take_local(batch_size)
+    try:
+        return _store(events) if events else 0
+    except Exception:
+        _put_back_local(events)
+        raise
+
+
+def requeue_local(batch_size: int = 1000) -> int:
+    """
+    Hand up to `batch_size` buffered events back to the stream once Redis is
+    reachable again, so flush_interactions() persists them. Returns events moved.
+    """
+    if not _local or is_degraded():
+        return 0
+    events = _take_local(batch_size)
+    if not events:
+        return 0
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(STREAM_KEY, event, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+        _put_back_local(events)
+        return 0
+    return len(events)
+
+
+def _release_lock(r, token: str) -> None:
+    global _release_script
+    if _release_script is None:
+        _release_script = r.register_script(RELEASE_SCRIPT)
+    _release_script(keys=[LOCK_KEY], args=[token], client=r)
+
+
+def flush_interactions(batch_size: int = 1000, max_batches: int = 100) -> int:
+    """Move buffered events into the DB; returns the number of rows written."""
+    written = drain_local(batch_size)
+    if is_degraded():
+        return written
+    r = get_redis()
+    token = uuid.uuid4().hex
+    try:
+        # one flusher at a time; the lock expires if a worker dies mid-flush
+        if not r.set(LOCK_KEY, token, nx=True, ex=300):
+            return written
+        try:
+            for _ in range(max_batches):
+                entries: List[Tuple[bytes, dict]] = r.xrange(STREAM_KEY, count=batch_size)
+                if not entries:
+                    break
+                written += _store(_decode(raw) for _, raw in entries)
+                r.xdel(STREAM_KEY, *[eid for eid, _ in entries])
+                if len(entries) < batch_size:
+                    break
+        finally:
+            _release_lock(r, token)
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+        _logger.warning("Interaction flush stopped early: %s", e)
+    return written
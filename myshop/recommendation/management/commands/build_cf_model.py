@@ -0,0 +1,20 @@
+# recommendation/management/commands/build_cf_model.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from recommendation.engine import MODEL_PATH, NEIGHBOURS, build_model
+
+
+class Command(BaseCommand):
+    help = "Build the item-item collaborative filtering model used by /api/recommend/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=MODEL_PATH, help="Where to write the .npz model.")
+        parser.add_argument("--neighbours", type=int, default=NEIGHBOURS, help="Similar items kept per product.")
+
+    def handle(self, *args, **opts):
+        model = build_model(opts["path"], neighbours=opts["neighbours"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved CF model ({len(model.item_ids)} products, {len(model.user_row)} customers) to {opts['path']}."
+        ))
@@ -0,0 +1,18 @@
+# recommendation/management/commands/flush_interactions.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from recommendation.events import flush_interactions
+
+
+class Command(BaseCommand):
+    help = "Write buffered user interaction events to the DB and update the daily rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Events per bulk insert.")
+        parser.add_argument("--max-batches", type=int, default=100, help="Stop after this many batches.")
+
+    def handle(self, *args, **opts):
+        written = flush_interactions(opts["batch_size"], opts["max_batches"])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} interaction events."))
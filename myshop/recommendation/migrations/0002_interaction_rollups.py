@@ -0,0 +1,51 @@
+# Generated by Django 5.0.11 on 2026-10-17 19:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendation', '0001_initial'),
+        ('shop', '0003_product_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('view', 'View'), ('click', 'Click'), ('purchase', 'Purchase')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='userinteraction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='userinteraction',
+            index=models.Index(fields=['user_id', 'product'], name='recommendat_user_id_918058_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinteraction',
+            index=models.Index(fields=['action', 'timestamp'], name='recommendat_action_ce75ca_idx'),
+        ),
+        migrations.AddField(
+            model_name='interactiondaily',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interaction_rollups', to='shop.product'),
+        ),
+        migrations.AddIndex(
+            model_name='interactiondaily',
+            index=models.Index(fields=['action', 'day'], name='recommendat_action_567fac_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='interactiondaily',
+            unique_together={('product', 'day', 'action')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.11 on 2026-10-17 21:10
+
+import datetime
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    # recompute from the raw rows rather than add to them, so running this
+    # after events.py has already written some rollups does not double count
+    UserInteraction = apps.get_model("recommendation", "UserInteraction")
+    InteractionDaily = apps.get_model("recommendation", "InteractionDaily")
+    totals = (
+        UserInteraction.objects
+        .annotate(day=TruncDate("timestamp", tzinfo=datetime.timezone.utc))  # events.py rolls up by UTC day
+        .values("product_id", "day", "action")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    InteractionDaily.objects.all().delete()
+    InteractionDaily.objects.bulk_create(
+        (InteractionDaily(product_id=t["product_id"], day=t["day"], action=t["action"], count=t["n"])
+         for t in totals.iterator()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendation', '0002_interaction_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from shop.models import Product 
 
 class UserInteraction(models.Model):
@@ -10,9 +11,31 @@ class UserInteraction(models.Model):
     user_id = models.CharField(max_length=50)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     action = models.CharField(max_length=10, choices=ACTIONS)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # event time (set by the producer; rows are inserted later in batches)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "product"]),
+            models.Index(fields=["action", "timestamp"]),
+        ]
 
     def __str__(self):
         return f"{self.user_id} - {self.action} - {self.product.name}"
 
 
+class InteractionDaily(models.Model):
+    """Per-product, per-day, per-action counts rolled up from UserInteraction."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="interaction_rollups")
+    day = models.DateField()
+    action = models.CharField(max_length=10, choices=UserInteraction.ACTIONS)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("product", "day", "action")
+        indexes = [models.Index(fields=["action", "day"])]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.day} - {self.action}: {self.count}"
+
+
@@ -0,0 +1,12 @@
+# recommendation/signals.py
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+from .events import requeue_local
+
+
+@receiver(request_finished)
+def _requeue_local_events(sender, **kwargs):
+    # events buffered while Redis was degraded would otherwise stay in this
+    # process until it exits; once Redis is back, push them to the stream
+    requeue_local()
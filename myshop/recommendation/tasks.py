@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .engine import build_model
+from .events import flush_interactions
+
+
+@shared_task(ignore_result=True)
+def rebuild_cf_model():
+    """Periodic rebuild of the collaborative filtering model (schedule with celery beat)."""
+    build_model()
+
+
+@shared_task(ignore_result=True)
+def flush_interaction_events():
+    """Drain buffered UserInteraction events into the DB (schedule every few seconds)."""
+    flush_interactions()
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import recommend_products
+from .views import log_events, recommend_products
 
 urlpatterns = [
     path('', recommend_products),
+    path('events/', log_events),
 ]
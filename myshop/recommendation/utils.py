@@ -1,21 +1,32 @@
 # recommendation/utils.py
 
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+
 from shop.models import Product
-from .models import UserInteraction
-from django.db.models import Count
+from .models import InteractionDaily, UserInteraction
+
+# how far back "most viewed" looks in the daily rollups
+POPULAR_WINDOW_DAYS = 30
+
 
-def get_recommendations_for_user(user_id, limit=5):
-    # Step 1: Get product IDs user has already interacted with
+def get_recommendations_for_user(user_id, limit=5, days=POPULAR_WINDOW_DAYS):
+    # Step 1: Get product IDs user has already interacted with (user_id index)
     seen_product_ids = UserInteraction.objects.filter(
         user_id=user_id
     ).values_list('product_id', flat=True)
 
-    # Step 2: Find most-viewed products not seen by this user
+    # Step 2: Most-viewed products not seen by this user, summed over the
+    # per-day rollups instead of counting the raw event table
+    since = timezone.now().date() - timedelta(days=days)
     recommendations = (
-        UserInteraction.objects
+        InteractionDaily.objects
+        .filter(action='view', day__gte=since)
         .exclude(product_id__in=seen_product_ids)
         .values('product_id')
-        .annotate(total=Count('id'))
+        .annotate(total=Sum('count'))
         .order_by('-total')[:limit]
     )
 
@@ -5,40 +5,37 @@ from rest_framework.response import Response
 from rest_framework import status
 
 def get_recommendations_for_user(username):
+    """
+    Item-item CF from the in-memory model (see recommendation/engine.py).
+    Unknown users, users without history, or no built model → a random
+    sample of available products.
+    """
     from shop.models import Product
-    from orders.models import OrderItem
     from django.contrib.auth import get_user_model
-    from django.db.models import Count
+    from .engine import get_model
 
     User = get_user_model()
+    model = get_model()
 
-    try:
-        user = User.objects.get(username=username)
-    except User.DoesNotExist:
-        # fallback: return 3 random products if user not found
-        return Product.objects.all().order_by('?')[:3]
-
-    user_product_ids = OrderItem.objects.filter(order__user=user).values_list('product_id', flat=True)
-
-    similar_users = OrderItem.objects.filter(
-        product_id__in=user_product_ids
-    ).exclude(order__user=user).values_list('order__user', flat=True)
-
-    recommended_product_data = (
-        OrderItem.objects
-        .filter(order__user__in=similar_users)
-        .exclude(product_id__in=user_product_ids)
-        .values('product_id')
-        .annotate(freq=Count('product_id'))
-        .order_by('-freq')[:5]
+    email = (
+        User.objects.filter(username=username).values_list("email", flat=True).first()
     )
+    product_ids = model.recommend(email, n=5) if (model and email) else []
+    if not product_ids:
+        # fallback: return 3 random products
+        product_ids = model.random_sample(3) if model else []
+    if not product_ids:
+        # no model, or its catalogue has sold out since the last build
+        product_ids = list(
+            Product.objects.filter(available=True).order_by("-id").values_list("id", flat=True)[:3]
+        )
 
-    product_ids = [item['product_id'] for item in recommended_product_data]
-    return Product.objects.filter(id__in=product_ids)
+    # the model is as of its last build; never serve products taken off sale since
+    by_id = Product.objects.filter(available=True).only("id", "name", "price").in_bulk(product_ids)
+    return [by_id[pid] for pid in product_ids if pid in by_id]
 
 @api_view(['POST'])
 def recommend_products(request):
-    print("Request data:", request.data)
     username = request.data.get('user_id')  # it's actually a username now
 
     if not username:
@@ -47,3 +44,38 @@ def recommend_products(request):
     recommendations = get_recommendations_for_user(username)
     data = [{"id": p.id, "name": p.name, "price": p.price} for p in recommendations]
     return Response(data)
+
+
+MAX_EVENTS_PER_REQUEST = 500
+
+@api_view(['POST'])
+def log_events(request):
+    """
+    Batched interaction logging: {"events": [{"product_id", "action"}, ...]}
+    or a single event object. Events are attributed to the requesting user (or
+    session); a client-sent user_id is ignored. Events are queued (see
+    recommendation/events.py), not inserted, so this returns 202 without
+    touching the DB.
+    """
+    from .events import log_interaction
+
+    payload = request.data
+    events = payload.get('events', [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(events, list) or len(events) > MAX_EVENTS_PER_REQUEST:
+        return Response(
+            {"error": f"send a list of at most {MAX_EVENTS_PER_REQUEST} events"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user_id = request.user.pk if request.user.is_authenticated else request.session.session_key
+    accepted = 0
+    for ev in events:
+        if not isinstance(ev, dict):
+            continue
+        try:
+            product_id = int(ev.get('product_id') or 0)
+        except (TypeError, ValueError):
+            continue
+        if log_interaction(user_id, product_id, ev.get('action')):
+            accepted += 1
+    return Response({"accepted": accepted, "rejected": len(events) - accepted}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,39 @@
+# recommender/checks.py
+from __future__ import annotations
+
+from django.core.checks import Error, Warning, register
+
+from core.cache import is_process_local
+
+
+@register()
+def rerank_cache_is_shared(app_configs, **kwargs):
+    from .llm import CACHE_ALIAS, _cache
+
+    if not is_process_local(_cache()):
+        return []
+    return [Warning(
+        f"The rerank cache ('{CACHE_ALIAS}') is process-local.",
+        hint=(
+            "invalidate_rerank_cache() from build_recs and the hit/miss stats only reach "
+            "the current process; point RERANK_CACHE_ALIAS at a shared (Redis) cache."
+        ),
+        id="recommender.W001",
+    )]
+
+
+@register()
+def async_rerank_needs_shared_cache(app_configs, **kwargs):
+    from .llm import CACHE_ALIAS, _cache
+    from .tasks import RERANK_ASYNC
+
+    if not RERANK_ASYNC or not is_process_local(_cache()):
+        return []
+    return [Error(
+        f"RERANK_ASYNC is on but the rerank cache ('{CACHE_ALIAS}') is process-local.",
+        hint=(
+            "Celery workers would store reranks where web processes never read them; "
+            "configure a shared (Redis) cache. Until then reranks run inline."
+        ),
+        id="recommender.E001",
+    )]
@@ -0,0 +1,194 @@
+# recommender/graphql_view.py
+"""
+GraphQL endpoint with guard rails.
+
+- Depth and cost limits reject expensive queries during validation.
+- Automatic persisted queries (Apollo protocol): clients may send only the
+  sha256 of a query they registered before; the registry is the shared
+  cache, so a hash registered with one process works with every other.
+- Parsing, validation and execution are graphene-django's own; this view only
+  adds rules (validation_rules), the persisted-query lookup and timings.
+- TimingMiddleware (enabled in settings.GRAPHENE) records resolver timings
+  and logs slow ones; root-field timings go out in a Server-Timing header.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseBadRequest
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError, get_named_type
+from graphql.language import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode,
+    IntValueNode, ListValueNode, OperationDefinitionNode,
+)
+from graphql.validation import ValidationRule, specified_rules
+
+from .schema import MAX_IDS
+
+_logger = logging.getLogger(__name__)
+
+MAX_DEPTH: int = int(getattr(settings, "GRAPHQL_MAX_DEPTH", 8))
+MAX_COST: int = int(getattr(settings, "GRAPHQL_MAX_COST", 1000))
+# `first` sent as a variable is charged at the resolver's cap
+MAX_LIST_SIZE: int = int(getattr(settings, "GRAPHQL_MAX_LIST_SIZE", 50))
+SLOW_MS: float = float(getattr(settings, "GRAPHQL_SLOW_MS", 200))
+PERSISTED_TTL: int = int(getattr(settings, "GRAPHQL_PERSISTED_TTL", 7 * 24 * 3600))
+
+
+# ---------------------------------------------------------------------------
+# Cost limit
+# ---------------------------------------------------------------------------
+def _list_size(node: FieldNode, field_def) -> int:
+    """How many items a field may return, from its `first`/`ids` argument."""
+    if field_def is None:
+        return 1
+    for arg in node.arguments or ():
+        if arg.name.value == "first":
+            if isinstance(arg.value, IntValueNode):
+                return max(1, min(int(arg.value.value), MAX_LIST_SIZE))
+            return MAX_LIST_SIZE
+        if arg.name.value == "ids":
+            # same cap as Query.products; a variable is charged at the cap
+            if isinstance(arg.value, ListValueNode):
+                return max(1, min(len(arg.value.values), MAX_IDS))
+            return MAX_IDS
+    first = field_def.args.get("first")
+    if first is not None and isinstance(first.default_value, int):
+        return first.default_value
+    return 1
+
+
+def query_cost(schema, selection_set, parent_type, fragments, multiplier: int = 1, _seen=frozenset()) -> int:
+    """Fields requested, each multiplied by the list sizes above it."""
+    total = 0
+    for sel in selection_set.selections:
+        if isinstance(sel, FieldNode):
+            name = sel.name.value
+            if name.startswith("__"):
+                continue
+            field_def = getattr(parent_type, "fields", {}).get(name)
+            total += multiplier
+            if sel.selection_set is not None and field_def is not None:
+                total += query_cost(
+                    schema, sel.selection_set, get_named_type(field_def.type), fragments,
+                    multiplier * _list_size(sel, field_def), _seen,
+                )
+        elif isinstance(sel, InlineFragmentNode):
+            t = schema.get_type(sel.type_condition.name.value) if sel.type_condition else parent_type
+            total += query_cost(schema, sel.selection_set, t, fragments, multiplier, _seen)
+        elif isinstance(sel, FragmentSpreadNode):
+            name = sel.name.value
+            frag = fragments.get(name)
+            if frag is None or name in _seen:  # cycles are reported by NoFragmentCycles
+                continue
+            t = schema.get_type(frag.type_condition.name.value)
+            total += query_cost(schema, frag.selection_set, t, fragments, multiplier, _seen | {name})
+    return total
+
+
+def cost_limit_validator(max_cost: int):
+    class CostLimitValidator(ValidationRule):
+        def enter_document(self, node, *_args):
+            schema = self.context.schema
+            fragments = {
+                d.name.value: d for d in node.definitions if isinstance(d, FragmentDefinitionNode)
+            }
+            for op in node.definitions:
+                if not isinstance(op, OperationDefinitionNode):
+                    continue
+                root = schema.get_root_type(op.operation)
+                cost = query_cost(schema, op.selection_set, root, fragments)
+                if cost > max_cost:
+                    name = op.name.value if op.name else "anonymous"
+                    self.report_error(GraphQLError(
+                        f"'{name}' has a cost of {cost}, which exceeds the maximum of {max_cost}.",
+                        [op],
+                    ))
+
+    return CostLimitValidator
+
+
+# ---------------------------------------------------------------------------
+# Resolver timing
+# ---------------------------------------------------------------------------
+class TimingMiddleware:
+    """Time resolvers; slow ones are logged, root fields go to Server-Timing."""
+
+    def resolve(self, next, root, info, **args):
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if info.path.prev is None:
+                timings = getattr(info.context, "_graphql_timings", None)
+                if timings is not None:
+                    timings.append((info.field_name, ms))
+            if ms >= SLOW_MS:
+                _logger.warning(
+                    "Slow GraphQL resolver %s.%s: %.1f ms",
+                    info.parent_type.name, info.field_name, ms,
+                )
+
+
+# ---------------------------------------------------------------------------
+# View
+# ---------------------------------------------------------------------------
+def _persisted_key(sha: str) -> str:
+    return f"graphql:pq:{sha}"
+
+
+class ShopGraphQLView(GraphQLView):
+    # the standard rules plus ours (a custom list replaces the defaults)
+    validation_rules = (
+        *specified_rules,
+        depth_limit_validator(max_depth=MAX_DEPTH),
+        cost_limit_validator(MAX_COST),
+    )
+
+    # ---- persisted queries ----
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        sha = ((extensions or {}).get("persistedQuery") or {}).get("sha256Hash")
+        if not sha:
+            return query, variables, operation_name, id
+
+        if query:
+            if hashlib.sha256(query.encode()).hexdigest() != sha:
+                raise HttpError(HttpResponseBadRequest("provided sha does not match query"))
+            cache.set(_persisted_key(sha), query, PERSISTED_TTL)
+        else:
+            query = cache.get(_persisted_key(sha))
+            if query is None:
+                raise HttpError(HttpResponse(status=200), "PersistedQueryNotFound")
+        return query, variables, operation_name, id
+
+    def dispatch(self, request, *args, **kwargs):
+        request._graphql_timings = []
+        start = time.perf_counter()
+        response = super().dispatch(request, *args, **kwargs)
+        total = (time.perf_counter() - start) * 1000
+
+        parts = [f"gql-{name};dur={ms:.1f}" for name, ms in request._graphql_timings]
+        parts.append(f"gql;dur={total:.1f}")
+        response["Server-Timing"] = ", ".join(parts)
+        if total >= SLOW_MS:
+            _logger.warning(
+                "Slow GraphQL request (%.1f ms): %s",
+                total, ", ".join(f"{n}={ms:.1f}ms" for n, ms in request._graphql_timings),
+            )
+        return response
@@ -0,0 +1,21 @@
+# recommender/hydrate.py
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List
+
+from shop.models import Product
+
+
+def hydrate(ids: Iterable[int]) -> Dict[int, Product]:
+    """Load all candidate products (with their category) in one query."""
+    return Product.objects.select_related("category").in_bulk(list(ids))
+
+
+def lookup_from(products: Dict[int, Product]) -> Callable[[int], Product]:
+    """Dict-backed product_lookup for rerank_with_ollama (KeyError = skip)."""
+    return products.__getitem__
+
+
+def in_order(products: Dict[int, Product], ids: Iterable[int]) -> List[Product]:
+    """Products for `ids` in that order, dropping ids that were not loaded."""
+    return [products[pid] for pid in ids if pid in products]
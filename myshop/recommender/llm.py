@@ -1,14 +1,20 @@
 # recommender/llm.py
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
+import threading
 import time
 from typing import Callable, Iterable, List, Sequence
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from django.core.cache import caches
+
+from core.cache import is_process_local
 
 # ---------------------------------------------------------------------
 # Config (env-backed with Django settings overrides)
@@ -20,6 +26,12 @@ TEMPERATURE: float = float(getattr(settings, "OLLAMA_TEMPERATURE", os.environ.ge
 MAX_CANDIDATES: int = int(getattr(settings, "OLLAMA_MAX_CANDIDATES", os.environ.get("OLLAMA_MAX_CANDIDATES", 30)))
 RETRIES: int = int(getattr(settings, "OLLAMA_RETRIES", os.environ.get("OLLAMA_RETRIES", 2)))
 BACKOFF_SEC: float = float(getattr(settings, "OLLAMA_BACKOFF_SEC", os.environ.get("OLLAMA_BACKOFF_SEC", 0.5)))
+CACHE_ALIAS: str = getattr(settings, "RERANK_CACHE_ALIAS", os.environ.get("RERANK_CACHE_ALIAS", "default"))
+CACHE_TTL: int = int(getattr(settings, "RERANK_CACHE_TTL", os.environ.get("RERANK_CACHE_TTL", 3600)))
+MAX_CONCURRENCY: int = int(getattr(settings, "OLLAMA_MAX_CONCURRENCY", os.environ.get("OLLAMA_MAX_CONCURRENCY", 2)))
+QUEUE_TIMEOUT: float = float(getattr(settings, "OLLAMA_QUEUE_TIMEOUT", os.environ.get("OLLAMA_QUEUE_TIMEOUT", 1.0)))
+BREAKER_THRESHOLD: int = int(getattr(settings, "OLLAMA_BREAKER_THRESHOLD", os.environ.get("OLLAMA_BREAKER_THRESHOLD", 3)))
+BREAKER_COOLDOWN: float = float(getattr(settings, "OLLAMA_BREAKER_COOLDOWN", os.environ.get("OLLAMA_BREAKER_COOLDOWN", 30)))
 
 SYSTEM_PROMPT = (
   "You are an e-commerce merchandiser AI. Given a shopper context and a list of candidate products "
@@ -31,9 +43,215 @@ SYSTEM_PROMPT = (
 
 _logger = logging.getLogger(__name__)
 
+_GEN_KEY = "recs:rerank:gen"
+_HITS_KEY = "recs:rerank:hits"
+_MISSES_KEY = "recs:rerank:misses"
+
+
+# ---------------------------------------------------------------------
+# Rerank result cache (Django cache backend, versioned by a generation)
+#
+# The generation and hit/miss counters coordinate processes (build_recs
+# bumps the generation from a management command), so RERANK_CACHE_ALIAS
+# must be a shared cache; checks.py flags a process-local one.
+# ---------------------------------------------------------------------
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _bump(key: str) -> None:
+    try:
+        _cache().incr(key)
+    except ValueError:
+        # counter missing or evicted
+        _cache().add(key, 1, timeout=None)
+
+
+def rerank_cache_key(context: dict, candidates: Sequence[int], cap: int) -> str:
+    """Cache key for a rerank: hash of the prompt inputs plus the current generation."""
+    gen = _cache().get_or_set(_GEN_KEY, 1, timeout=None)
+    raw = json.dumps(
+        {
+            "intent": context.get("intent", "similar"),
+            "anchor": context.get("anchor_product_id"),
+            "recent": context.get("recent_product_ids", []),
+            "budget": context.get("budget"),
+            "ids": [int(pid) for pid in candidates],
+            "cap": cap,
+            "model": MODEL,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return f"recs:rerank:{gen}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def invalidate_rerank_cache() -> None:
+    """Orphan every cached rerank (called when similarities are rebuilt)."""
+    try:
+        _cache().incr(_GEN_KEY)
+    except ValueError:
+        _cache().set(_GEN_KEY, 2, timeout=None)
+
+
+def cached_rerank(
+    context: dict, candidates: Sequence[int], *, max_candidates: int | None = None, key: str | None = None,
+) -> List[int] | None:
+    """
+    Previously computed ranking for these inputs, or None (counts hit/miss).
+    Pass `key` when the caller already has rerank_cache_key() for them.
+    """
+    if not candidates:
+        return []
+    key = key or rerank_cache_key(context, candidates, max_candidates or MAX_CANDIDATES)
+    cached = _cache().get(key)
+    if cached is None:
+        _bump(_MISSES_KEY)
+        return None
+    _bump(_HITS_KEY)
+    return list(cached)
+
+
+def rerank_cache_stats() -> dict:
+    """Hit/miss counters for monitoring."""
+    c = _cache()
+    hits = int(c.get(_HITS_KEY) or 0)
+    misses = int(c.get(_MISSES_KEY) or 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+        "generation": c.get(_GEN_KEY),
+        "ttl": CACHE_TTL,
+        # per-process counters/generation: numbers cover this worker only
+        "shared": not is_process_local(c),
+    }
+
+
+# ---------------------------------------------------------------------
+# Transport: pooled keep-alive session, concurrency cap, circuit breaker
+# ---------------------------------------------------------------------
+class LLMUnavailable(Exception):
+    """The LLM was skipped (breaker open or no free slot); use the baseline."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for
+    `cooldown` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._trial_owner: int | None = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial = True  # half-open: one caller probes
+            self._trial_owner = threading.get_ident()
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                # a failed trial reopens for a full cooldown
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def end_trial(self) -> None:
+        """
+        Release this thread's trial if it ended without an outcome (no free
+        slot, unexpected error), so the next caller can probe instead of the
+        breaker staying half-open forever.
+        """
+        with self._lock:
+            if self._trial and self._trial_owner == threading.get_ident():
+                self._trial = False
+
+    def state(self) -> dict:
+        with self._lock:
+            if self._opened_at is None:
+                name, retry_in = "closed", 0.0
+            else:
+                left = self.cooldown - (time.monotonic() - self._opened_at)
+                name = "half_open" if self._trial or left <= 0 else "open"
+                retry_in = max(0.0, left)
+            return {
+                "state": name,
+                "consecutive_failures": self._failures,
+                "retry_in_sec": round(retry_in, 1),
+            }
+
+
+_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+_slots = threading.BoundedSemaphore(max(1, MAX_CONCURRENCY))
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Process-wide session so calls reuse keep-alive connections to Ollama."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                sess = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, MAX_CONCURRENCY))
+                sess.mount("http://", adapter)
+                sess.mount("https://", adapter)
+                _session = sess
+    return _session
+
+
+def llm_status() -> dict:
+    """Breaker and concurrency state for monitoring."""
+    return {
+        "breaker": _breaker.state(),
+        "in_flight": _in_flight,
+        "max_concurrency": MAX_CONCURRENCY,
+    }
+
 
 def _chat(messages: list[dict]) -> str:
-    """Call Ollama /api/chat with minimal noise and light retries."""
+    """
+    Call Ollama /api/chat with minimal noise and light retries.
+    Raises LLMUnavailable without calling out when the breaker is open or
+    all MAX_CONCURRENCY slots stay busy for QUEUE_TIMEOUT seconds.
+    """
+    if not _breaker.allow():
+        raise LLMUnavailable("circuit open")
+    try:
+        if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+            raise LLMUnavailable("no free LLM slot")
+        try:
+            return _post_chat(messages)
+        finally:
+            _slots.release()
+    finally:
+        _breaker.end_trial()
+
+
+def _post_chat(messages: list[dict]) -> str:
+    global _in_flight
     payload = {
         "model": MODEL,
         "stream": False,
@@ -41,20 +259,28 @@ def _chat(messages: list[dict]) -> str:
         "messages": messages,
     }
 
-    attempt = 0
-    while True:
-        attempt += 1
-        try:
-            r = requests.post(f"{HOST}/api/chat", json=payload, timeout=TIMEOUT)
-            r.raise_for_status()
-            data = r.json()  # Expected: {"message": {"content": "..."}}
-            content = (data.get("message") or {}).get("content", "")
-            return content.strip()
-        except Exception as e:
-            if attempt > RETRIES:
-                raise
-            # Quiet retry with exponential-ish backoff
-            time.sleep(BACKOFF_SEC * attempt)
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                r = _get_session().post(f"{HOST}/api/chat", json=payload, timeout=TIMEOUT)
+                r.raise_for_status()
+                data = r.json()  # Expected: {"message": {"content": "..."}}
+                content = (data.get("message") or {}).get("content", "")
+                _breaker.record_success()
+                return content.strip()
+            except Exception as e:
+                if attempt > RETRIES:
+                    _breaker.record_failure()
+                    raise
+                # Quiet retry with exponential-ish backoff
+                time.sleep(BACKOFF_SEC * attempt)
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
 
 
 def _coerce_json_id_list(s: str) -> List[int]:
@@ -78,6 +304,13 @@ def _coerce_json_id_list(s: str) -> List[int]:
         return []
 
 
+def _category_name(category) -> str:
+    """Plain category name (str(Category) walks the parent chain, one query per level)."""
+    if category is None:
+        return ""
+    return str(getattr(category, "name", category) or "")
+
+
 def _dedupe_keep_order(ids: Iterable[int]) -> List[int]:
     seen = set()
     out: List[int] = []
@@ -94,6 +327,7 @@ def rerank_with_ollama(
     product_lookup: Callable[[int], object],
     *,
     max_candidates: int | None = None,
+    refresh: bool = False,
 ) -> List[int]:
     """
     Rerank candidate product IDs using Ollama (Llama 3).
@@ -101,6 +335,7 @@ def rerank_with_ollama(
     - candidates: list of product IDs to rank
     - product_lookup: function(pid) -> product object with attrs: id, name, price, category, tags_list
     - max_candidates: optional cap; defaults to OLLAMA_MAX_CANDIDATES
+    - refresh: skip the cache lookup (background jobs) but still store the result
 
     Returns a list of product IDs in the desired order.
     On any error or invalid model output, returns the original candidate order.
@@ -109,6 +344,14 @@ def rerank_with_ollama(
         return []
 
     cap = max_candidates or MAX_CANDIDATES
+
+    # Same inputs always give the same prompt: serve a previous ranking if cached
+    cache_key = rerank_cache_key(context, candidates, cap)
+    if not refresh:
+        cached = cached_rerank(context, candidates, key=cache_key)
+        if cached is not None:
+            return cached
+
     # Clamp + dedupe to keep prompt compact and deterministic
     base_list = _dedupe_keep_order(list(candidates))[:cap]
 
@@ -126,7 +369,7 @@ def rerank_with_ollama(
                 "id": getattr(p, "id", pid),
                 "name": getattr(p, "name", "") or "",
                 "price": float(getattr(p, "price", 0.0) or 0.0),
-                "category": getattr(p, "category", "") or "",
+                "category": _category_name(getattr(p, "category", None)),
                 "tags": list(getattr(p, "tags_list", []) or []),
             }
         )
@@ -169,8 +412,14 @@ def rerank_with_ollama(
 
         # Finally, append any candidates that were clipped by cap (keep original order)
         overflow = [pid for pid in candidates if pid not in base_list]
-        return ordered + overflow
+        result = ordered + overflow
+        # only successful reranks are cached; fallbacks retry on the next request
+        _cache().set(cache_key, result, CACHE_TTL)
+        return result
 
+    except LLMUnavailable as e:
+        _logger.info("Ollama rerank skipped; using baseline order: %s", e)
+        return list(candidates)
     except Exception as e:
         # Quiet log: one line, no stack unless DEBUG
         _logger.exception("Ollama rerank failed; using baseline order: %s", e)
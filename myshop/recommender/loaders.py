@@ -0,0 +1,86 @@
+# recommender/loaders.py
+"""
+DataLoader-style batching for the GraphQL schema.
+
+The schema executes synchronously, so instead of promise-based loaders each
+request gets plain loaders that queue keys (`prime_keys`) and fetch every
+queued key in one query the first time one of them is loaded. Results are
+cached for the rest of the request, so a nested field resolved for N parents
+costs one query instead of N.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from shop.models import Category, Product
+
+
+class BatchLoader:
+    def __init__(self, batch_fn: Callable[[List[Any]], Dict[Any, Any]]):
+        self._batch_fn = batch_fn
+        self._cache: Dict[Hashable, Any] = {}
+        self._queue: Set[Hashable] = set()
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        self._cache.setdefault(key, value)
+
+    def prime_keys(self, keys: Iterable[Hashable]) -> None:
+        """Queue keys so the next load() fetches them in the same query."""
+        self._queue.update(k for k in keys if k is not None and k not in self._cache)
+
+    def _dispatch(self) -> None:
+        # keys primed while their batch was in flight are already cached
+        keys = [k for k in self._queue if k not in self._cache]
+        self._queue.clear()
+        found = self._batch_fn(keys) if keys else {}
+        for key in keys:
+            self._cache[key] = found.get(key)
+
+    def load(self, key: Optional[Hashable]) -> Any:
+        if key is None:
+            return None
+        if key not in self._cache:
+            self._queue.add(key)
+            self._dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        keys = list(keys)
+        self.prime_keys(keys)
+        if self._queue:
+            self._dispatch()
+        return [self._cache.get(k) for k in keys]
+
+
+class Loaders:
+    def __init__(self):
+        self.products = BatchLoader(
+            lambda ids: Product.objects.select_related("category").in_bulk(ids)
+        )
+        self.categories = BatchLoader(self._load_categories)
+
+    def _load_categories(self, ids) -> Dict[Any, Category]:
+        found = Category.objects.in_bulk(ids)
+        # queue the parents: `parent { ... }` then costs one query per tree
+        # level for the whole response instead of one per category
+        self.categories.prime_keys(c.parent_id for c in found.values())
+        return found
+
+    def prime_products(self, products: Iterable[Product]) -> None:
+        """Cache already-loaded products and their categories."""
+        for p in products:
+            self.products.prime(p.pk, p)
+            if Product.category.is_cached(p):
+                self.categories.prime(p.category_id, p.category)
+                self.categories.prime_keys([p.category.parent_id])
+            else:
+                self.categories.prime_keys([p.category_id])
+
+
+def get_loaders(context) -> Loaders:
+    """One set of loaders per request (the GraphQL context is the HttpRequest)."""
+    loaders = getattr(context, "_recommender_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, "_recommender_loaders", loaders)
+    return loaders
@@ -0,0 +1,59 @@
+# recommender/management/commands/bench_recs.py
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import QuerySet
+
+from recommender.models import ProductSimilarity, UserRecommendation
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the query plans and latency of the candidate lookups used by "
+        "ProductRecommendations / the GraphQL resolver and UserRecommendations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, help="Anchor product id (default: first one with rows).")
+        parser.add_argument("--user", type=int, help="User id (default: first one with rows).")
+        parser.add_argument("--limit", type=int, default=30, help="Candidates fetched per lookup.")
+        parser.add_argument("--repeat", type=int, default=200, help="Timed executions per query.")
+
+    def _run(self, label: str, qs: QuerySet, repeat: int) -> None:
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(str(qs.query))
+        self.stdout.write(qs.explain())
+        list(qs)  # warm up
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            list(qs.all())  # .all() clones, so every run hits the DB
+        avg_ms = (time.perf_counter() - t0) * 1000 / repeat
+        self.stdout.write(self.style.SUCCESS(f"{avg_ms:.3f} ms/query over {repeat} runs\n"))
+
+    def handle(self, *args, **opts):
+        limit, repeat = opts["limit"], opts["repeat"]
+
+        product_id = opts["product"] or (
+            ProductSimilarity.objects.values_list("base_id", flat=True).first()
+        )
+        if product_id is None:
+            raise CommandError("No ProductSimilarity rows; run build_recs first.")
+        self._run(
+            f"ProductSimilarity: base={product_id}",
+            ProductSimilarity.objects.filter(base_id=product_id)
+            .order_by("-score").values_list("other_id", flat=True)[:limit],
+            repeat,
+        )
+
+        user_id = opts["user"] or UserRecommendation.objects.values_list("user_id", flat=True).first()
+        if user_id is None:
+            self.stdout.write("No UserRecommendation rows; skipping (run build_user_recs).")
+            return
+        self._run(
+            f"UserRecommendation: user={user_id}",
+            UserRecommendation.objects.filter(user_id=user_id)
+            .order_by("-score").values_list("product_id", flat=True)[:limit],
+            repeat,
+        )
@@ -1,24 +1,36 @@
 # recommender/management/commands/build_recs.py
 from __future__ import annotations
 
+import multiprocessing
+import os
 import warnings
-from collections import defaultdict
-from typing import Dict, Iterable, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Max, Q
+from django.utils import timezone
 
 # Quiet common lib warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
 
 from shop.models import Product
 from orders.models import OrderItem  # adjust if your app name/path differs
-from recommender.models import ProductSimilarity
+from recommender.llm import invalidate_rerank_cache
+from recommender.models import ProductSimilarity, SimilarityBuildRun
+
+# TF-IDF vocabulary, IDF and product vectors from the last run; delta runs
+# vectorise only the changed products against them
+TFIDF_PATH: str = str(getattr(settings, "SIMILARITY_TFIDF_PATH", "tfidf_state.npz"))
 
 
 # -----------------------
@@ -61,31 +73,252 @@ def product_text(p: Product) -> str:
     return " ".join(s for s in parts if s).strip()
 
 
-def build_copurchase_counts(order_items: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+def corpus_for(products: Iterable[Product], trunc: int) -> List[str]:
+    corpus = [product_text(p) for p in products]
+    if trunc and trunc > 0:
+        corpus = [c[:trunc] for c in corpus]
+    return corpus
+
+
+# -----------------------
+# TF-IDF (fit on full runs, reused by delta runs)
+# -----------------------
+def fit_tfidf(corpus: List[str], *, max_features: int, ngram_max: int) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """(X, terms, idf) for the whole catalogue; rows are L2-normalised."""
+    vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=(1, ngram_max), dtype=np.float32)
+    X = vectorizer.fit_transform(corpus).tocsr()
+    return X, vectorizer.get_feature_names_out(), vectorizer.idf_.astype(np.float32)
+
+
+def tfidf_rows(corpus: List[str], terms: np.ndarray, idf: np.ndarray, *, ngram_max: int) -> sparse.csr_matrix:
+    """Vectorise with a saved vocabulary and IDF (what TfidfVectorizer.transform does)."""
+    counts = CountVectorizer(
+        vocabulary={t: i for i, t in enumerate(terms.tolist())}, ngram_range=(1, ngram_max), dtype=np.float32,
+    ).transform(corpus)
+    return normalize((counts @ sparse.diags(idf)).tocsr(), copy=False).astype(np.float32)
+
+
+def save_tfidf(path: str, ids: np.ndarray, X: sparse.csr_matrix, terms: np.ndarray, idf: np.ndarray, params) -> None:
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(
+        tmp, ids=ids, data=X.data, indices=X.indices, indptr=X.indptr, shape=X.shape,
+        terms=np.asarray(terms, dtype=str), idf=idf, params=np.asarray(params),
+    )
+    os.replace(tmp, path)
+
+
+def load_tfidf(path: str, params) -> Optional[Tuple[np.ndarray, sparse.csr_matrix, np.ndarray, np.ndarray]]:
+    """(ids, X, terms, idf) saved by the last run, or None if missing or built with other options."""
+    try:
+        with np.load(path) as z:
+            if not np.array_equal(z["params"], np.asarray(params)):
+                return None
+            X = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+            return z["ids"], X, z["terms"], z["idf"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _cooccurrence(lines: np.ndarray, lookup: np.ndarray, n: int) -> sparse.csr_matrix:
     """
-    Build co-purchase counts from (order_id, product_id) pairs.
-    Returns dict mapping (pid_a, pid_b) -> count.
+    Co-purchase counts for complete orders in `lines` ((order_id, product_id) rows).
+    Builds an orders x products incidence matrix B and returns B.T @ B without
+    the diagonal, i.e. the number of orders containing each product pair.
     """
-    by_order: Dict[int, List[int]] = defaultdict(list)
-    for oid, pid in order_items:
-        by_order[oid].append(pid)
-
-    co: Dict[Tuple[int, int], int] = defaultdict(int)
-    for plist in by_order.values():
-        n = len(plist)
-        if n < 2:
-            continue
-        for i in range(n):
-            a = plist[i]
-            for j in range(i + 1, n):
-                b = plist[j]
-                if a == b:
-                    continue
-                co[(a, b)] += 1
-                co[(b, a)] += 1
+    pids = lines[:, 1]
+    known = pids < len(lookup)
+    cols = np.full(len(pids), -1, dtype=np.int64)
+    cols[known] = lookup[pids[known]]
+    keep = cols >= 0
+    if not keep.any():
+        return sparse.csr_matrix((n, n), dtype=np.int32)
+    _, order_rows = np.unique(lines[keep, 0], return_inverse=True)
+    cols = cols[keep]
+    B = sparse.csr_matrix(
+        (np.ones(len(cols), dtype=np.int32), (order_rows, cols)),
+        shape=(int(order_rows.max()) + 1, n),
+    )
+    B.data[:] = 1  # a product listed twice in one order still counts once
+    co = (B.T @ B).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
     return co
 
 
+def copurchase_matrix(
+    ids: np.ndarray, *, chunk_size: int = 100_000, only: Optional[Collection[int]] = None,
+) -> Optional[sparse.csr_matrix]:
+    """
+    Stream (order_id, product_id) from OrderItem in order_id order and accumulate
+    an N x N sparse co-purchase matrix aligned with `ids` (row i = product ids[i]).
+    Each row is scaled to 0..1 by its own largest count, so a product's scores
+    depend only on the orders it appears in. With `only`, just those orders
+    are read and only the rows of `only` are complete. Memory is bounded by
+    chunk_size plus the non-zeros of the result. Returns None when there is no
+    co-purchase signal.
+    """
+    n = len(ids)
+    lookup = np.full(int(ids.max()) + 1, -1, dtype=np.int64)
+    lookup[ids] = np.arange(n)
+
+    lines = OrderItem.objects.all()
+    if only is not None:
+        lines = lines.filter(
+            order_id__in=OrderItem.objects.filter(product_id__in=list(only)).values("order_id")
+        )
+    stream = (
+        lines
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    co = sparse.csr_matrix((n, n), dtype=np.int32)
+    carry = np.empty((0, 2), dtype=np.int64)
+    while True:
+        chunk = list(islice(stream, chunk_size))
+        if not chunk:
+            break
+        lines = np.concatenate([carry, np.asarray(chunk, dtype=np.int64)])
+        # the last order may continue in the next chunk; hold it back
+        tail = lines[:, 0] == lines[-1, 0]
+        carry = lines[tail]
+        if (~tail).any():
+            co = co + _cooccurrence(lines[~tail], lookup, n)
+    if len(carry):
+        co = co + _cooccurrence(carry, lookup, n)
+
+    if not co.nnz:
+        return None
+    co = co.astype(np.float32)
+    row_max = co.max(axis=1).toarray().ravel()
+    scale = np.divide(1.0, row_max, out=np.zeros_like(row_max), where=row_max > 0)
+    return (sparse.diags(scale) @ co).tocsr()
+
+
+# -----------------------
+# Top-K engine (runs in-process or inside worker processes)
+# -----------------------
+_STATE: tuple = ()
+
+
+def _init_state(X: sparse.csr_matrix, co: Optional[sparse.csr_matrix], w_co: float, topk: int) -> None:
+    """Share the matrices with _topk_block (once per worker, not per block)."""
+    global _STATE
+    _STATE = (X, X.T.tocsr(), co, w_co, topk)
+
+
+def _topk_block(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score the given rows against every product and keep the top-K.
+    TF-IDF rows are L2-normalised, so X_block @ X.T is the cosine similarity;
+    only a (block x N) slice is ever materialised.
+    Returns (row_idx, col_idx, score) arrays, best first within each row.
+    """
+    X, XT, co, w_co, topk = _STATE
+    n = X.shape[0]
+    k = min(topk, n - 1)
+    if k <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    block = X[rows] @ XT
+    if co is not None and w_co > 0:
+        block = block + co[rows] * w_co
+    dense = block.toarray().astype(np.float32, copy=False)
+
+    # never recommend a product for itself
+    dense[np.arange(len(rows)), rows] = -np.inf
+
+    idx = np.argpartition(-dense, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(dense, idx, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+
+    return np.repeat(rows, k), idx.ravel(), scores.ravel()
+
+
+def topk_similarities(
+    X: sparse.csr_matrix,
+    co: Optional[sparse.csr_matrix],
+    *,
+    w_co: float,
+    topk: int,
+    rows: Optional[np.ndarray] = None,
+    block_size: int = 512,
+    workers: int = 1,
+) -> Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield _topk_block results block by block, in row order.
+    - rows: row indices to score (default: every product)
+    """
+    if rows is None:
+        rows = np.arange(X.shape[0])
+    blocks = [rows[s:s + block_size] for s in range(0, len(rows), block_size)]
+    if workers <= 1 or len(blocks) <= 1:
+        _init_state(X, co, w_co, topk)
+        for b in blocks:
+            yield _topk_block(b)
+        return
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        # spawned workers would re-import this module (and the models) before
+        # Django is set up; score in-process instead
+        yield from topk_similarities(X, co, w_co=w_co, topk=topk, rows=rows, block_size=block_size)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_state,
+        initargs=(X, co, w_co, topk),
+    ) as pool:
+        yield from pool.map(_topk_block, blocks)
+
+
+def changed_product_ids(since, last_order_item_id: int) -> set:
+    """
+    Products whose neighbour lists are stale since the last run:
+    edited products, every product in an order that gained lines, and every
+    product that currently lists one of those as a neighbour. Products that would
+    newly rank a changed product are only picked up by a --full run.
+    """
+    changed = set(Product.objects.filter(updated__gte=since).values_list("id", flat=True))
+    new_orders = OrderItem.objects.filter(id__gt=last_order_item_id).values("order_id")
+    changed.update(
+        OrderItem.objects.filter(order_id__in=new_orders).values_list("product_id", flat=True).distinct()
+    )
+    if changed:
+        changed.update(
+            ProductSimilarity.objects.filter(other_id__in=changed).values_list("base_id", flat=True).distinct()
+        )
+    return changed
+
+
+def write_neighbours(base_ids: List[int], bulk: List[ProductSimilarity], *, chunk: int = 200) -> None:
+    """
+    Upsert the neighbour lists of `base_ids` (unique on base/other) and drop
+    the pairs that fell out of the top-K, in one short transaction.
+    """
+    kept: Dict[int, List[int]] = {b: [] for b in base_ids}
+    for s in bulk:
+        kept[s.base_id].append(s.other_id)
+
+    with transaction.atomic():
+        ProductSimilarity.objects.bulk_create(
+            bulk,
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=["base", "other"],
+            update_fields=["score"],
+        )
+        items = list(kept.items())
+        for start in range(0, len(items), chunk):
+            stale = Q()
+            for base, others in items[start:start + chunk]:
+                stale |= (Q(base_id=base) & ~Q(other_id__in=others)) if others else Q(base_id=base)
+            ProductSimilarity.objects.filter(stale).delete()
+
+
 # -----------------------
 # Management command
 # -----------------------
@@ -98,6 +331,10 @@ class Command(BaseCommand):
         parser.add_argument("--ngram-max", type=int, default=2, help="TF-IDF ngram upper bound (1..N).")
         parser.add_argument("--copurchase-weight", type=float, default=0.30, help="Blend weight for co-purchase (0..1).")
         parser.add_argument("--truncate", type=int, default=0, help="If >0, truncate corpus strings to this many chars.")
+        parser.add_argument("--block-size", type=int, default=512, help="Rows scored per block (bounds RAM to block x N).")
+        parser.add_argument("--workers", type=int, default=1, help="Processes used to score blocks in parallel.")
+        parser.add_argument("--chunk-size", type=int, default=100_000, help="OrderItem rows streamed per chunk.")
+        parser.add_argument("--full", action="store_true", help="Rebuild every product (and refit TF-IDF) instead of only changed ones.")
 
     def handle(self, *args, **opts):
         topk: int = opts["topk"]
@@ -105,56 +342,99 @@ class Command(BaseCommand):
         ngram_max: int = opts["ngram_max"]
         w_co: float = opts["copurchase_weight"]
         trunc: int = opts["truncate"]
+        block_size: int = max(1, opts["block_size"])
+        workers: int = max(1, opts["workers"])
         verbosity: int = opts.get("verbosity", 1)
 
-        products: List[Product] = list(Product.objects.all())
-        if not products:
-            if verbosity > 0:
-                self.stdout.write(self.style.WARNING("No products found."))
-            return
-
-        # --- TF-IDF corpus
-        corpus = [product_text(p) for p in products]
-        if trunc and trunc > 0:
-            corpus = [c[:trunc] for c in corpus]
-
-        vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=(1, ngram_max))
-        X = vectorizer.fit_transform(corpus)
-        sim = cosine_similarity(X)
-
-        # --- Co-purchase signal
-        multi_ids = (
-            OrderItem.objects.values("order_id")
-            .annotate(n=Count("id"))
-            .filter(n__gte=2)
-            .values_list("order_id", flat=True)
+        # Watermarks are taken before reading, so edits made during this run
+        # are picked up by the next one.
+        started_at = timezone.now()
+        last_order_item_id = OrderItem.objects.aggregate(m=Max("id"))["m"] or 0
+        last_run = SimilarityBuildRun.objects.filter(finished_at__isnull=False).first()
+        full: bool = opts["full"] or last_run is None
+        params = (max_features, ngram_max, trunc)
+
+        state = None
+        if not full:
+            state = load_tfidf(TFIDF_PATH, params)
+            if state is None:
+                full = True
+                if verbosity > 0:
+                    self.stdout.write(self.style.WARNING(
+                        f"No TF-IDF state for these options at {TFIDF_PATH}; running a full build."
+                    ))
+
+        changed = set()
+        if not full:
+            changed = changed_product_ids(last_run.started_at, last_run.last_order_item_id)
+            if not changed:
+                SimilarityBuildRun.objects.create(
+                    started_at=started_at, finished_at=timezone.now(),
+                    full=False, last_order_item_id=last_order_item_id,
+                )
+                if verbosity > 0:
+                    self.stdout.write(self.style.SUCCESS("No changed products since last run."))
+                return
+
+        if full:
+            # --- TF-IDF fit on the full catalogue so IDF stays global
+            products: List[Product] = list(Product.objects.select_related("category").order_by("id"))
+            if not products:
+                if verbosity > 0:
+                    self.stdout.write(self.style.WARNING("No products found."))
+                return
+            ids = np.array([p.id for p in products], dtype=np.int64)
+            X, terms, idf = fit_tfidf(corpus_for(products, trunc), max_features=max_features, ngram_max=ngram_max)
+        else:
+            # --- Delta: vectorise only changed and new products with the saved
+            # vocabulary and IDF; everyone else keeps their saved row. New
+            # terms and IDF drift are picked up by the next --full run.
+            saved_ids, saved_X, terms, idf = state
+            ids = np.array(sorted(Product.objects.values_list("id", flat=True)), dtype=np.int64)
+            if not len(ids):
+                if verbosity > 0:
+                    self.stdout.write(self.style.WARNING("No products found."))
+                return
+            saved_pos = {pid: i for i, pid in enumerate(saved_ids.tolist())}
+            fresh = [pid for pid in ids.tolist() if pid in changed or pid not in saved_pos]
+            by_id = Product.objects.select_related("category").in_bulk(fresh)
+            fresh = [pid for pid in fresh if pid in by_id]  # deleted since the id list was read
+            fresh_X = tfidf_rows(corpus_for([by_id[pid] for pid in fresh], trunc), terms, idf, ngram_max=ngram_max)
+            fresh_pos = {pid: len(saved_ids) + j for j, pid in enumerate(fresh)}
+            keep = [pid for pid in ids.tolist() if pid in fresh_pos or pid in saved_pos]
+            ids = np.array(keep, dtype=np.int64)
+            stacked = sparse.vstack([saved_X, fresh_X]).tocsr()
+            X = stacked[[fresh_pos.get(pid, saved_pos.get(pid)) for pid in keep]]
+        save_tfidf(TFIDF_PATH, ids, X, terms, idf, params)
+        index = {int(pid): i for i, pid in enumerate(ids)}
+
+        # --- Co-purchase signal (delta: only orders containing a changed product)
+        co = copurchase_matrix(ids, chunk_size=opts["chunk_size"], only=None if full else changed)
+
+        # --- Score in blocks (bounded memory); each block replaces only its own
+        # neighbour lists, so readers never see an empty table.
+        rows = None if full else np.array(sorted(index[pid] for pid in changed if pid in index), dtype=np.int64)
+        rebuilt = 0
+        for r_idx, c_idx, scores in topk_similarities(
+            X, co, w_co=w_co, topk=topk, rows=rows, block_size=block_size, workers=workers
+        ):
+            bases = ids[r_idx]
+            bulk = [
+                ProductSimilarity(base_id=b, other_id=o, score=float(sc))
+                for b, o, sc in zip(bases.tolist(), ids[c_idx].tolist(), scores.tolist())
+            ]
+            base_ids = np.unique(bases).tolist()
+            write_neighbours(base_ids, bulk)
+            rebuilt += len(base_ids)
+
+        SimilarityBuildRun.objects.create(
+            started_at=started_at, finished_at=timezone.now(), full=full,
+            last_order_item_id=last_order_item_id, products_rebuilt=rebuilt,
         )
-        order_items = OrderItem.objects.filter(order_id__in=multi_ids).values_list("order_id", "product_id")
-        co = build_copurchase_counts(order_items)
-        max_co = max(co.values()) if co else 1
-
-        # --- Write results
-        with transaction.atomic():
-            ProductSimilarity.objects.all().delete()
-            bulk: List[ProductSimilarity] = []
-
-            for i, p in enumerate(products):
-                row = sim[i]
-                scored: List[Tuple[int, float]] = []
-                for j, q in enumerate(products):
-                    if i == j:
-                        continue
-                    s = float(row[j])
-                    c = co.get((p.id, q.id), 0)
-                    if c and w_co > 0 and max_co > 0:
-                        s += w_co * (c / max_co)
-                    scored.append((q.id, s))
-
-                scored.sort(key=lambda t: t[1], reverse=True)
-                for pid, sc in scored[:topk]:
-                    bulk.append(ProductSimilarity(base=p, other_id=pid, score=sc))
-
-            ProductSimilarity.objects.bulk_create(bulk, batch_size=2000)
+        if rebuilt:
+            # candidate lists changed; cached LLM orderings are stale
+            invalidate_rerank_cache()
 
         if verbosity > 0:
-            self.stdout.write(self.style.SUCCESS(f"Built similarities for {len(products)} products (topK={topk})."))
+            mode = "full" if full else "delta"
+            self.stdout.write(self.style.SUCCESS(f"Built similarities for {rebuilt} products ({mode}, topK={topk})."))
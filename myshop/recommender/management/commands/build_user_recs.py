@@ -0,0 +1,22 @@
+# recommender/management/commands/build_user_recs.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from recommender.user_recs import build_user_recommendations
+
+
+class Command(BaseCommand):
+    help = "Materialise per-user top-K recommendations (purchase history x product similarities)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--topk", type=int, default=30, help="Recommendations stored per user.")
+        parser.add_argument("--block-size", type=int, default=1000, help="Users scored per block.")
+        parser.add_argument("--email", action="append", help="Only refresh these accounts (repeatable).")
+
+    def handle(self, *args, **opts):
+        n = build_user_recommendations(
+            opts["email"], topk=opts["topk"], block_size=max(1, opts["block_size"])
+        )
+        if opts.get("verbosity", 1) > 0:
+            self.stdout.write(self.style.SUCCESS(f"Built recommendations for {n} users."))
@@ -0,0 +1,14 @@
+# recommender/management/commands/rebuild_popularity.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from recommender.popularity import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Reconcile the popularity leaderboards (overall and per category) with paid orders."
+
+    def handle(self, *args, **opts):
+        n = rebuild_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt popularity leaderboards ({n} products)."))
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.11 on 2026-10-17 19:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def _dedupe(apps, model_name, fields):
+    """Keep the newest row per key so the unique constraint can be added."""
+    Model = apps.get_model("recommender", model_name)
+    dupes = (
+        Model.objects.values(*fields)
+        .annotate(n=Count("id"), keep=Max("id"))
+        .filter(n__gt=1)
+    )
+    for row in dupes.iterator():
+        key = {f: row[f] for f in fields}
+        Model.objects.filter(**key).exclude(id=row["keep"]).delete()
+
+
+def dedupe_rows(apps, schema_editor):
+    _dedupe(apps, "ProductSimilarity", ["base", "other"])
+    _dedupe(apps, "UserRecommendation", ["user", "product"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0002_similaritybuildrun'),
+        ('shop', '0003_product_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='productsimilarity',
+            unique_together={('base', 'other')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='userrecommendation',
+            unique_together={('user', 'product')},
+        ),
+        migrations.AddIndex(
+            model_name='productsimilarity',
+            index=models.Index(fields=['base', '-score'], name='recommender_sim_base_score'),
+        ),
+        migrations.AddIndex(
+            model_name='userrecommendation',
+            index=models.Index(fields=['user', '-score'], name='recommender_rec_user_score'),
+        ),
+    ]
@@ -8,12 +8,23 @@ class ProductSimilarity(models.Model):
     other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sim_other')
     score = models.FloatField(default=0.0)
 
+    class Meta:
+        unique_together = ("base", "other")
+        indexes = [
+            models.Index(fields=["base", "-score"], name="recommender_sim_base_score"),
+        ]
 
-class Meta:
-    unique_together = ("base", "other")
-    indexes = [
-    models.Index(fields=["base", "score"]),
-    ]
+
+class SimilarityBuildRun(models.Model):
+    """Watermark for build_recs: one row per run, newest first."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    last_order_item_id = models.BigIntegerField(default=0)
+    products_rebuilt = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
 
 
 class UserRecommendation(models.Model):
@@ -21,7 +32,6 @@ class UserRecommendation(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     score = models.FloatField(default=0.0)
 
-
-class Meta:
-    unique_together = ("user", "product")
-    indexes = [models.Index(fields=["user", "score"])]
\ No newline at end of file
+    class Meta:
+        unique_together = ("user", "product")
+        indexes = [models.Index(fields=["user", "-score"], name="recommender_rec_user_score")]
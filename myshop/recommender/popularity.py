@@ -0,0 +1,145 @@
+# recommender/popularity.py
+"""
+Popularity leaderboard for cold-start fallbacks.
+
+Redis sorted sets hold paid order lines per product, overall and per category.
+Paid orders increment them (recommender/signals.py) and `rebuild_leaderboard()`
+reconciles them with the DB (celery beat / the rebuild_popularity command).
+Reads are a single ZREVRANGE once a rebuild has seeded the sets (marked by
+BUILT_KEY); until then, and while Redis is degraded, reads come from a
+Django-cache snapshot written by the last rebuild (or aggregated once from the
+DB). Counting orders into sets that were never seeded would rank only what
+sold since deploy. Short leaderboards are padded from the snapshot.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from core.redis_client import REDIS_ERRORS, get_redis, is_degraded, mark_degraded
+from orders.models import OrderItem
+
+_logger = logging.getLogger(__name__)
+
+ALL_KEY = "popular:all"
+CATEGORY_KEY = "popular:cat:{}"
+# set by rebuild_leaderboard(): the sorted sets hold every paid order
+BUILT_KEY = "popular:built"
+# entries kept per leaderboard, and in the Django-cache snapshot
+SIZE: int = int(getattr(settings, "POPULARITY_SIZE", 200))
+SNAPSHOT_TTL: int = int(getattr(settings, "POPULARITY_SNAPSHOT_TTL", 24 * 3600))
+
+
+def _key(category_id: Optional[int]) -> str:
+    return ALL_KEY if category_id is None else CATEGORY_KEY.format(category_id)
+
+
+def _snapshot_key(category_id: Optional[int]) -> str:
+    return f"recs:{_key(category_id)}"
+
+
+def _from_db(category_id: Optional[int], limit: int) -> List[int]:
+    lines = OrderItem.objects.filter(order__paid=True)
+    if category_id is not None:
+        lines = lines.filter(product__category_id=category_id)
+    return list(
+        lines.values("product_id")
+        .annotate(n=Count("id"))
+        .order_by("-n", "product_id")
+        .values_list("product_id", flat=True)[:limit]
+    )
+
+
+def _snapshot(category_id: Optional[int]) -> List[int]:
+    ids = cache.get(_snapshot_key(category_id))
+    if ids is None:
+        # no snapshot yet: aggregate once and keep it until the next rebuild
+        ids = _from_db(category_id, SIZE)
+        cache.set(_snapshot_key(category_id), ids, SNAPSHOT_TTL)
+    return ids
+
+
+def top_products(limit: int = 30, category_id: Optional[int] = None) -> List[int]:
+    """Most-bought product ids, best first (overall or within one category)."""
+    if not is_degraded():
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.exists(BUILT_KEY)
+            pipe.zrevrange(_key(category_id), 0, limit - 1)
+            built, members = pipe.execute()
+            if built:
+                ids = [int(m) for m in members]
+                if len(ids) < limit:
+                    seen = set(ids)
+                    ids += [pid for pid in _snapshot(category_id) if pid not in seen][:limit - len(ids)]
+                return ids
+            # never rebuilt: the sets only hold orders since deploy
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+    return _snapshot(category_id)[:limit]
+
+
+def record_order(order_id: int) -> None:
+    """Count a newly paid order's lines (one query, one pipeline)."""
+    if is_degraded():
+        return  # the next rebuild picks these up
+    lines = OrderItem.objects.filter(order_id=order_id).values_list("product_id", "product__category_id")
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for product_id, category_id in lines:
+            pipe.zincrby(ALL_KEY, 1, product_id)
+            if category_id is not None:
+                pipe.zincrby(_key(category_id), 1, product_id)
+        pipe.execute()
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+
+
+def rebuild_leaderboard() -> int:
+    """
+    Recompute every leaderboard from paid orders and swap it in atomically.
+    Also refreshes the Django-cache snapshots. Returns products counted.
+    """
+    counts: Dict[Optional[int], Dict[int, int]] = {None: {}}
+    rows = (
+        OrderItem.objects.filter(order__paid=True)
+        .values_list("product_id", "product__category_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for product_id, category_id, n in rows.iterator():
+        counts[None][product_id] = n
+        if category_id is not None:
+            counts.setdefault(category_id, {})[product_id] = n
+
+    def ranked(scores: Dict[int, int]) -> List[int]:
+        return sorted(scores, key=lambda pid: (-scores[pid], pid))[:SIZE]
+
+    cache.set_many({_snapshot_key(c): ranked(s) for c, s in counts.items()}, SNAPSHOT_TTL)
+
+    try:
+        r = get_redis()
+        stale = {k.decode() if isinstance(k, bytes) else k for k in r.scan_iter(CATEGORY_KEY.format("*"))}
+        pipe = r.pipeline(transaction=True)
+        for category_id, scores in counts.items():
+            key = _key(category_id)
+            stale.discard(key)
+            if scores:
+                tmp = f"{key}:tmp"
+                pipe.delete(tmp)
+                pipe.zadd(tmp, {pid: scores[pid] for pid in ranked(scores)})
+                pipe.rename(tmp, key)
+            else:
+                pipe.delete(key)
+        for key in stale:
+            pipe.delete(key)
+        pipe.set(BUILT_KEY, 1)
+        pipe.execute()
+    except REDIS_ERRORS as e:
+        mark_degraded(e)
+        _logger.warning("Popularity leaderboard not written to Redis: %s", e)
+    return len(counts[None])
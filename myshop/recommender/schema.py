@@ -4,29 +4,47 @@ import math
 import logging
 import graphene
 from graphene_django import DjangoObjectType
-from django.db.models import Count
-from shop.models import Product
-from orders.models import OrderItem
+from shop.models import Category, Product
 from recommender.models import ProductSimilarity
+from recommender.hydrate import hydrate, in_order
+from recommender.loaders import get_loaders
+from recommender.popularity import top_products
 
 logger = logging.getLogger(__name__)
 
 # ---- Optional: only import LLM if configured, and guard at call site
 try:
-    from recommender.llm import rerank_with_ollama
+    from recommender.tasks import rerank_or_schedule
 except Exception as e:
     logger.warning("LLM rerank unavailable: %s", e)
-    rerank_with_ollama = None
+    rerank_or_schedule = None
+
+# upper bound for Query.products(ids: ...)
+MAX_IDS = 100
+
+
+class CategoryType(DjangoObjectType):
+    class Meta:
+        model = Category
+        fields = ("id", "name", "slug", "parent")
+
+    def resolve_parent(root, info):
+        return get_loaders(info.context).categories.load(root.parent_id)
 
 
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         # adapt to your fields
-        fields = ("id", "name", "price", "image")
+        fields = ("id", "name", "slug", "price", "image", "category")
+
+    def resolve_category(root, info):
+        # batched: one query for the categories of every product in the response
+        return get_loaders(info.context).categories.load(root.category_id)
 
 
 class Query(graphene.ObjectType):
+    products = graphene.List(ProductType, ids=graphene.List(graphene.NonNull(graphene.ID), required=True))
     recommended_products = graphene.List(
         ProductType,
         product_id=graphene.ID(required=True),
@@ -35,6 +53,16 @@ class Query(graphene.ObjectType):
         exclude_ids=graphene.List(graphene.ID),   # optional
     )
 
+    def resolve_products(self, info, ids):
+        try:
+            keys = [int(i) for i in ids][:MAX_IDS]
+        except (TypeError, ValueError):
+            return []
+        loaders = get_loaders(info.context)
+        products = [p for p in loaders.products.load_many(keys) if p is not None]
+        loaders.prime_products(products)
+        return products
+
     def resolve_recommended_products(
         self,
         info,
@@ -88,13 +116,7 @@ class Query(graphene.ObjectType):
                     .values_list("id", flat=True)[:60]
                 )
 
-            popular_ids = list(
-                OrderItem.objects
-                .values("product_id")
-                .annotate(n=Count("id"))
-                .order_by("-n")
-                .values_list("product_id", flat=True)[:60]
-            )
+            popular_ids = top_products(60)
 
             # combine: prefer same category, then popular (unique, drop anchor)
             seen = {anchor_id}
@@ -118,9 +140,14 @@ class Query(graphene.ObjectType):
         if ex_ids:
             sims = [pid for pid in sims if pid not in ex_ids]
 
+        # one query hydrates every candidate for the filters, reranker and result
+        by_id = hydrate(sims)
+
         if has_budget:
-            prices = dict(Product.objects.filter(id__in=sims).values_list("id", "price"))
-            sims = [pid for pid in sims if pid in prices and prices[pid] is not None and float(prices[pid]) <= max_price]
+            sims = [
+                pid for pid in sims
+                if pid in by_id and by_id[pid].price is not None and float(by_id[pid].price) <= max_price
+            ]
 
         # still nothing? bail early
         if not sims:
@@ -128,26 +155,24 @@ class Query(graphene.ObjectType):
 
         # ---- optional LLM rerank with guard ----
         ranked_ids = []
-        if rerank_with_ollama:
+        if rerank_or_schedule:
             try:
-                def lookup(pid): return Product.objects.get(id=pid)
                 context = {
                     "intent": "similar",
                     "anchor_product_id": anchor_id,
                     "budget": max_price,
                     "recent_product_ids": [],
                 }
-                ranked_ids = rerank_with_ollama(context, sims, lookup) or []
+                ranked_ids, _source = rerank_or_schedule(context, sims, by_id)
             except Exception:
                 logger.exception("LLM rerank failed; using baseline order.")
                 ranked_ids = []
 
         ids_final = (ranked_ids or sims)[:first]
 
-        # ---- hydrate & preserve order ----
-        products = list(Product.objects.filter(id__in=ids_final))
-        idx = {pid: i for i, pid in enumerate(ids_final)}
-        products.sort(key=lambda p: idx.get(p.id, 10_000))
+        # ---- preserve order ----
+        products = in_order(by_id, ids_final)
+        get_loaders(info.context).prime_products(products)
         return products
 
 
@@ -5,4 +5,4 @@ from shop.models import Product
 class ProductCardSerializer(serializers.ModelSerializer):
  class Meta:
   model = Product
-fields = ["id", "name", "price", "image"] # adjust to your fields
\ No newline at end of file
+  fields = ["id", "name", "price", "image"] # adjust to your fields
\ No newline at end of file
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+
+from .popularity import record_order
+from .tasks import refresh_user_recommendations
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Order)
+def _refresh_on_paid(sender, instance: Order, created: bool, **kwargs):
+    # Only when transitioned from unpaid -> paid (_was_paid is set by orders.signals)
+    if not (instance.paid and not getattr(instance, "_was_paid", False)):
+        return
+
+    def _after_commit():
+        record_order(instance.pk)
+        if not instance.email:
+            return
+        try:
+            refresh_user_recommendations.apply_async((instance.email,), retry=False)
+        except Exception as e:
+            logger.warning("Could not queue user recommendation refresh: %s", e)
+
+    transaction.on_commit(_after_commit)
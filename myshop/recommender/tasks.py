@@ -0,0 +1,81 @@
+# recommender/tasks.py
+from __future__ import annotations
+
+import logging
+from typing import List, Sequence, Tuple
+
+from celery import shared_task
+from django.conf import settings
+
+from core.cache import is_process_local
+
+from .hydrate import hydrate, lookup_from
+from .llm import (
+    BACKOFF_SEC, MAX_CANDIDATES, RETRIES, TIMEOUT,
+    _cache, cached_rerank, rerank_cache_key, rerank_with_ollama,
+)
+
+_logger = logging.getLogger(__name__)
+
+SOURCE_BASELINE = "baseline"
+SOURCE_RERANK = "llama3_rerank"
+
+# Serve the baseline order and rerank on Celery instead of blocking the request.
+# Needs a shared rerank cache (checks.py errors otherwise, and it reranks inline).
+RERANK_ASYNC: bool = bool(getattr(settings, "RERANK_ASYNC", False))
+# Long enough for a worst-case _chat (all retries + backoff) before re-queueing
+PENDING_TTL: int = int(TIMEOUT * (RETRIES + 1) + BACKOFF_SEC * RETRIES * (RETRIES + 1) / 2) + 5
+
+
+def _pending_key(context: dict, candidates: Sequence[int]) -> str:
+    return rerank_cache_key(context, candidates, MAX_CANDIDATES) + ":pending"
+
+
+@shared_task(ignore_result=True)
+def rerank_candidates(context: dict, candidates: List[int]) -> None:
+    """Run the LLM rerank off the request path; the result lands in the rerank cache."""
+    try:
+        by_id = hydrate(candidates)
+        rerank_with_ollama(context, candidates, lookup_from(by_id), refresh=True)
+    finally:
+        _cache().delete(_pending_key(context, candidates))
+
+
+def rerank_or_schedule(context: dict, candidates: Sequence[int], by_id: dict) -> Tuple[List[int], str]:
+    """
+    Return (ranked_ids, source).
+    Sync mode reranks inline. Async mode returns a cached rerank if one is
+    ready, otherwise the baseline order while one background job is queued.
+    """
+    if not RERANK_ASYNC or is_process_local(_cache()):
+        # a worker's result in its own memory would never reach this process
+        return rerank_with_ollama(context, candidates, lookup_from(by_id)), SOURCE_RERANK
+
+    key = rerank_cache_key(context, candidates, MAX_CANDIDATES)
+    cached = cached_rerank(context, candidates, key=key)
+    if cached is not None:
+        return cached, SOURCE_RERANK
+
+    pending = key + ":pending"
+    # add() is atomic: only one request per input set enqueues a job
+    if _cache().add(pending, 1, PENDING_TTL):
+        try:
+            rerank_candidates.apply_async((context, list(candidates)), retry=False)
+        except Exception as e:
+            _cache().delete(pending)
+            _logger.warning("Could not queue rerank job; serving baseline: %s", e)
+    return list(candidates), SOURCE_BASELINE
+
+
+@shared_task(ignore_result=True)
+def refresh_user_recommendations(email: str) -> None:
+    """Recompute stored recommendations for the account that just paid."""
+    from .user_recs import build_user_recommendations
+    build_user_recommendations([email])
+
+
+@shared_task(ignore_result=True)
+def reconcile_popularity() -> None:
+    """Rebuild the popularity leaderboards from paid orders (schedule with celery beat)."""
+    from .popularity import rebuild_leaderboard
+    rebuild_leaderboard()
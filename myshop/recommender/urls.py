@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import ProductRecommendations, RerankCacheStats, UserRecommendations
+
+urlpatterns = [
+    path("product/<int:product_id>/", ProductRecommendations.as_view(), name="recommendations-product"),
+    path("user/", UserRecommendations.as_view(), name="recommendations-user"),
+    path("user/<int:user_id>/", UserRecommendations.as_view(), name="recommendations-user-detail"),
+    path("stats/", RerankCacheStats.as_view(), name="recommendations-stats"),
+]
@@ -0,0 +1,160 @@
+# recommender/user_recs.py
+"""
+Materialise per-user recommendations into UserRecommendation.
+
+Scores are purchases @ similarities: a users x products purchase matrix P
+(paid orders, linked to accounts by e-mail since Order has no user FK) times
+the sparse ProductSimilarity matrix S, with already-bought products masked.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from scipy import sparse
+
+from orders.models import OrderItem
+from shop.models import Product
+from .models import ProductSimilarity, UserRecommendation
+
+
+def _product_index(ids: Iterable[int]) -> Dict[int, int]:
+    return {pid: i for i, pid in enumerate(ids)}
+
+
+def _purchases(user_by_email: Dict[str, int], *, only_these: bool) -> List[tuple[int, int]]:
+    """(user_id, product_id) for every paid order line of the given accounts."""
+    lines = (
+        OrderItem.objects
+        .filter(order__paid=True)
+        .annotate(email=Lower("order__email"))
+    )
+    if only_these:
+        lines = lines.filter(email__in=list(user_by_email))
+    out = []
+    for email, pid in lines.values_list("email", "product_id").iterator(chunk_size=10_000):
+        uid = user_by_email.get(email)
+        if uid is not None:
+            out.append((uid, pid))
+    return out
+
+
+def _similarity_matrix(
+    similarities: Iterable[tuple[int, int, float]], index: Dict[int, int]
+) -> sparse.csr_matrix:
+    rows, cols, vals = [], [], []
+    for base, other, score in similarities:
+        if base in index and other in index:
+            rows.append(index[base])
+            cols.append(index[other])
+            vals.append(score)
+    n = len(index)
+    return sparse.csr_matrix((np.asarray(vals, dtype=np.float32), (rows, cols)), shape=(n, n))
+
+
+def _purchase_matrix(
+    purchases: List[tuple[int, int]], index: Dict[int, int]
+) -> tuple[np.ndarray, sparse.csr_matrix]:
+    """(user_ids, P) where P[u, i] counts paid order lines of product i."""
+    slot: Dict[int, int] = {}
+    rows, cols = [], []
+    for uid, pid in purchases:
+        if pid not in index:
+            continue
+        rows.append(slot.setdefault(uid, len(slot)))
+        cols.append(index[pid])
+    user_ids = np.fromiter(slot, dtype=np.int64, count=len(slot))
+    P = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(slot), len(index)),
+    )
+    return user_ids, P
+
+
+def _write(user_ids: List[int], bulk: List[UserRecommendation], *, chunk: int = 200) -> None:
+    """
+    Upsert the recommendations of `user_ids` (unique on user/product) and drop
+    products that are no longer in their top-K, in one short transaction.
+    """
+    kept: Dict[int, List[int]] = {u: [] for u in user_ids}
+    for rec in bulk:
+        kept[rec.user_id].append(rec.product_id)
+
+    with transaction.atomic():
+        UserRecommendation.objects.bulk_create(
+            bulk,
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=["user", "product"],
+            update_fields=["score"],
+        )
+        items = list(kept.items())
+        for start in range(0, len(items), chunk):
+            stale = Q()
+            for uid, products in items[start:start + chunk]:
+                stale |= (Q(user_id=uid) & ~Q(product_id__in=products)) if products else Q(user_id=uid)
+            UserRecommendation.objects.filter(stale).delete()
+
+
+def build_user_recommendations(
+    emails: Optional[Iterable[str]] = None,
+    *,
+    topk: int = 30,
+    block_size: int = 1000,
+) -> int:
+    """
+    Recompute UserRecommendation rows for every active user with an e-mail,
+    or only for the accounts matching `emails`. Returns users processed.
+    """
+    User = get_user_model()
+    users = User.objects.filter(is_active=True).exclude(email="")
+    if emails is not None:
+        wanted = [e.lower() for e in emails if e]
+        users = users.annotate(email_l=Lower("email")).filter(email_l__in=wanted)
+    user_by_email = {email.lower(): uid for uid, email in users.values_list("id", "email")}
+    if not user_by_email:
+        return 0
+
+    purchases = _purchases(user_by_email, only_these=emails is not None)
+    similarities = ProductSimilarity.objects.values_list("base_id", "other_id", "score")
+    if emails is None:
+        index = _product_index(Product.objects.order_by("id").values_list("id", flat=True))
+        S = _similarity_matrix(similarities.iterator(), index)
+    else:
+        # a few accounts (one paid order): only the neighbour lists of what
+        # they bought, indexed over the products those lists reach
+        bought = {pid for _, pid in purchases}
+        similarities = list(similarities.filter(base_id__in=bought)) if bought else []
+        index = _product_index(sorted(bought | {other for _, other, _ in similarities}))
+        S = _similarity_matrix(similarities, index)
+    ids = np.fromiter(index, dtype=np.int64, count=len(index))
+    user_ids, P = _purchase_matrix(purchases, index)
+
+    for start in range(0, len(user_ids), block_size):
+        block = P[start:start + block_size]
+        dense = (block @ S).toarray()
+        dense[block.nonzero()] = 0.0  # never recommend what they already bought
+
+        k = min(topk, dense.shape[1])
+        top = np.argpartition(-dense, k - 1, axis=1)[:, :k] if k else np.empty((len(dense), 0), dtype=np.int64)
+        scores = np.take_along_axis(dense, top, axis=1)
+
+        bulk = [
+            UserRecommendation(user_id=int(uid), product_id=int(ids[col]), score=float(sc))
+            for uid, cols, scs in zip(user_ids[start:start + block_size], top, scores)
+            for col, sc in zip(cols, scs)
+            if sc > 0
+        ]
+        _write(user_ids[start:start + block_size].tolist(), bulk)
+
+    # accounts without any scored purchase keep no stale rows
+    stale = sorted(set(user_by_email.values()) - set(user_ids.tolist()))
+    for start in range(0, len(stale), block_size):
+        UserRecommendation.objects.filter(user_id__in=stale[start:start + block_size]).delete()
+    if emails is None:
+        UserRecommendation.objects.filter(user__is_active=False).delete()
+    return len(user_by_email)
@@ -1,7 +1,6 @@
 # recommender/views.py
 from __future__ import annotations
 
-from collections import defaultdict
 from typing import List
 
 from django.db.models import Count
@@ -9,11 +8,14 @@ from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from shop.models import Product
 from orders.models import OrderItem
-from .models import ProductSimilarity
+
+from .models import ProductSimilarity, UserRecommendation
+from .hydrate import hydrate, in_order
 from .serializers import ProductCardSerializer
-from .llm import rerank_with_ollama
+from .llm import llm_status, rerank_cache_stats
+from .popularity import top_products
+from .tasks import rerank_or_schedule
 
 
 class ProductRecommendations(APIView):
@@ -21,6 +23,7 @@ class ProductRecommendations(APIView):
     GET /api/recommendations/product/<product_id>/
     Baseline: top ProductSimilarity rows for the anchor product.
     Then rerank with Ollama (Llama 3) and return top 12.
+    "source" is "baseline" while an async rerank is still pending.
     """
     permission_classes = [permissions.AllowAny]
 
@@ -35,88 +38,84 @@ class ProductRecommendations(APIView):
 
         # Fallback to popular if no similarity rows exist
         if not sims:
-            popular = (
-                OrderItem.objects.values('product_id')
-                .annotate(n=Count('id'))
-                .order_by('-n')[:30]
-            )
-            sims = [p['product_id'] for p in popular]
+            sims = [pid for pid in top_products(31) if pid != product_id][:30]
 
-        def lookup(pid: int) -> Product:
-            return Product.objects.get(id=pid)
+        # One query for every candidate; reused by the reranker and the response
+        by_id = hydrate(sims)
 
-        # 2) LLM rerank
+        # 2) LLM rerank (or baseline now + background rerank in async mode)
         context = {"intent": "similar", "anchor_product_id": int(product_id)}
-        ranked_ids = rerank_with_ollama(context, sims, lookup)
+        ranked_ids, source = rerank_or_schedule(context, sims, by_id)
 
-        # 3) Fetch and preserve order (limit to 12)
-        top_ids = ranked_ids[:12] if ranked_ids else []
-        products = list(Product.objects.filter(id__in=top_ids))
-        products.sort(key=lambda p: top_ids.index(p.id) if p.id in top_ids else 1_000_000)
+        # 3) Preserve order (limit to 12)
+        products = in_order(by_id, ranked_ids[:12] if ranked_ids else [])
 
         data = ProductCardSerializer(products, many=True).data
-        return Response({"source": "llama3_rerank", "items": data})
+        return Response({"source": source, "items": data})
+
+
+def recent_product_ids(user, n: int = 5) -> List[int]:
+    """The user's most-bought products (orders are matched by email)."""
+    if not user.email:
+        return []
+    return list(
+        OrderItem.objects
+        .filter(order__email__iexact=user.email)
+        .values('product_id')
+        .annotate(n=Count('id'))
+        .order_by('-n')
+        .values_list('product_id', flat=True)[:n]
+    )
 
 
 class UserRecommendations(APIView):
     """
     GET /api/recommendations/user/<user_id>/
-    Uses the authenticated user's recent purchases to form candidates,
-    then reranks with Ollama and returns top 12.
+    Reads the user's materialised UserRecommendation rows (build_user_recs,
+    refreshed when their orders are paid), then reranks with Ollama and
+    returns top 12.
+    "source" is "baseline" while an async rerank is still pending.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, user_id=None):
         user = request.user
 
-        # 1) Recent interactions → product IDs
-        last_items = (
-            OrderItem.objects
-            .filter(order__user=user)
-            .values('product_id')
-            .annotate(n=Count('id'))
-            .order_by('-n')[:5]
+        # 1) Candidate generation: precomputed rows, one indexed query
+        sims: List[int] = list(
+            UserRecommendation.objects
+            .filter(user=user)
+            .order_by('-score')
+            .values_list('product_id', flat=True)[:30]
         )
-        pids = [r['product_id'] for r in last_items]
 
-        # Candidate generation
-        if not pids:
+        if not sims:
             # Cold-start: popular items
-            popular = (
-                OrderItem.objects.values('product_id')
-                .annotate(n=Count('id'))
-                .order_by('-n')[:30]
-            )
-            sims = [p['product_id'] for p in popular]
-        else:
-            # Merge similar lists across last seen/bought products
-            scores = defaultdict(float)
-            for pid in pids:
-                for s in (
-                    ProductSimilarity.objects
-                    .filter(base_id=pid)
-                    .order_by('-score')[:30]
-                ):
-                    scores[s.other_id] += s.score
-            # Remove already bought/seen
-            for pid in pids:
-                scores.pop(pid, None)
-            sims = [pid for pid, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:30]]
-
-        def lookup(pid: int) -> Product:
-            return Product.objects.get(id=pid)
-
-        # 2) LLM rerank
+            sims = top_products(30)
+
+        # One query for every candidate; reused by the reranker and the response
+        by_id = hydrate(sims)
+
+        # 2) LLM rerank (or baseline now + background rerank in async mode)
         context = {
             "intent": "personalized",
-            "recent_product_ids": pids,
+            "recent_product_ids": recent_product_ids(user),
         }
-        ranked_ids = rerank_with_ollama(context, sims, lookup)
+        ranked_ids, source = rerank_or_schedule(context, sims, by_id)
 
-        # 3) Fetch and preserve order (limit to 12)
-        top_ids = ranked_ids[:12] if ranked_ids else []
-        products = list(Product.objects.filter(id__in=top_ids))
-        products.sort(key=lambda p: top_ids.index(p.id) if p.id in top_ids else 1_000_000)
+        # 3) Preserve order (limit to 12)
+        products = in_order(by_id, ranked_ids[:12] if ranked_ids else [])
 
         data = ProductCardSerializer(products, many=True).data
-        return Response({"source": "llama3_rerank", "items": data})
+        return Response({"source": source, "items": data})
+
+
+class RerankCacheStats(APIView):
+    """
+    GET /api/recommendations/stats/
+    Rerank cache hit/miss counters and LLM circuit-breaker state (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"cache": rerank_cache_stats(), "llm": llm_status()})
@@ -0,0 +1,60 @@
+# shop/category_tree.py
+"""
+Cached category tree.
+
+All categories are loaded in one query and kept in the shared Django cache
+together with the nested tree. signals.py drops the entry when a category
+changes; the short TTL covers changes that skip signals (queryset.update(),
+raw SQL, a delete that failed while Redis was down).
+Templates, serializers and Category.__str__ read from it instead of walking
+`parent` one query at a time.
+"""
+from __future__ import annotations
+
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+CACHE_KEY = "shop:category_tree"
+TTL: int = int(getattr(settings, "CATEGORY_TREE_TTL", 300))
+
+
+def _build() -> dict:
+    categories = list(Category.objects.order_by("depth", "name"))
+    nodes: Dict[int, dict] = {}
+    roots: List[dict] = []
+    for c in categories:  # parents come first (ordered by depth)
+        node = {"id": c.id, "name": c.name, "slug": c.slug, "depth": c.depth, "children": []}
+        nodes[c.id] = node
+        parent = nodes.get(c.parent_id)
+        (parent["children"] if parent else roots).append(node)
+    return {
+        "categories": sorted(categories, key=lambda c: c.name),
+        "names": {c.id: c.name for c in categories},
+        "tree": roots,
+    }
+
+
+def _cached() -> dict:
+    return cache.get_or_set(CACHE_KEY, _build, TTL)
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+
+
+def cached_categories() -> List[Category]:
+    """Every category (ordered by name) without a query when the cache is warm."""
+    return _cached()["categories"]
+
+
+def category_names() -> Dict[int, str]:
+    return _cached()["names"]
+
+
+def get_tree() -> List[dict]:
+    """Nested [{id, name, slug, depth, children: [...]}, ...] roots."""
+    return _cached()["tree"]
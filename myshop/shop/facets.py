@@ -0,0 +1,278 @@
+# shop/facets.py
+"""
+Precomputed facet bitsets for product filtering.
+
+The index gives every product a bit position and keeps one bitset (a Python
+int) per facet value: color, size, brand, material, category and price band.
+Filtering is ORs within a facet and ANDs across facets. Facet counts are
+popcounts, and each facet is counted with every *other* filter applied, so
+shoppers see how many results each extra value would give. No per-value
+aggregate queries are needed.
+
+The index lives in process memory. signals.py bumps a version number in the
+shared Django cache whenever products, colors or sizes change, and each
+process rebuilds its index (five queries) on the next read after a bump.
+FACET_INDEX_TTL bounds how old an index may get regardless, so a missed bump
+(bulk updates bypass signals, the cache was unreachable) heals on its own.
+
+Bits follow the database's name order, which is the product list's cursor
+order: a page of matches is the next run of set bits after the cursor, so
+the list view never has to send every matching id to the database.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Color, Product, Size
+
+VERSION_KEY = "shop:facets:version"
+# upper bounds of the price bands shown as a facet; the last band is open
+PRICE_BANDS: List[int] = list(getattr(settings, "FACET_PRICE_BANDS", [10, 20, 50, 100]))
+# seconds before a process rebuilds its index even without a version bump
+INDEX_TTL: int = getattr(settings, "FACET_INDEX_TTL", 300)
+# query param -> facet name
+PARAMS = {"color": "color", "size": "size", "brand": "brand", "material": "material", "category": "category"}
+
+
+def bump_version() -> None:
+    """Mark every process's index stale (called from signals)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _band(price: Decimal) -> str:
+    lower = 0
+    for upper in PRICE_BANDS:
+        if price < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+@dataclass
+class FacetIndex:
+    ids: List[int] = field(default_factory=list)              # bit -> product id
+    position: Dict[int, int] = field(default_factory=dict)    # product id -> bit
+    by_name: Dict[str, int] = field(default_factory=dict)     # product name -> bit
+    bits: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    labels: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    # for arbitrary price ranges: products sorted by price
+    price_sorted: List[Decimal] = field(default_factory=list)
+    price_bits: List[int] = field(default_factory=list)
+
+    @property
+    def all(self) -> int:
+        return (1 << len(self.ids)) - 1
+
+    def _add(self, facet: str, value, bit: int, label: Optional[str] = None) -> None:
+        key = str(value)
+        values = self.bits.setdefault(facet, {})
+        values[key] = values.get(key, 0) | (1 << bit)
+        if label is not None:
+            self.labels.setdefault(facet, {})[key] = label
+
+    def price_mask(self, low: Optional[Decimal], high: Optional[Decimal]) -> int:
+        start = 0 if low is None else bisect.bisect_left(self.price_sorted, low)
+        end = len(self.price_sorted) if high is None else bisect.bisect_right(self.price_sorted, high)
+        return self._mask(self.price_bits[start:end])
+
+    def mask_for_ids(self, ids: Iterable[int]) -> int:
+        return self._mask(self.position[pid] for pid in ids if pid in self.position)
+
+    def _mask(self, bits: Iterable[int]) -> int:
+        # build the bitset as a string once instead of OR-ing big ints per bit
+        flags = bytearray(b"0" * len(self.ids))
+        for bit in bits:
+            flags[bit] = 0x31  # "1"
+        return int(flags[::-1].decode() or "0", 2)
+
+    def ids_in(self, mask: int) -> List[int]:
+        """Product ids for the set bits, in bit (= name) order."""
+        digits = bin(mask)[:1:-1]  # least significant bit first
+        return [self.ids[i] for i, d in enumerate(digits) if d == "1"]
+
+    def window(self, mask: int, size: int, after: Optional[str] = None, reverse: bool = False) -> Optional[List[int]]:
+        """
+        Ids of the next `size` matches in name order past the product called
+        `after` (before it when `reverse`). None if that name is not in the
+        index, e.g. the product was renamed since the cursor was issued.
+        """
+        if after is None:
+            start = len(self.ids) if reverse else -1
+        elif after in self.by_name:
+            start = self.by_name[after]
+        else:
+            return None
+        if reverse:
+            digits = bin(mask & ((1 << start) - 1))[2:]  # most significant bit first
+            top = len(digits) - 1
+            bits = (top - i for i, d in enumerate(digits) if d == "1")
+        else:
+            digits = bin(mask >> (start + 1))[:1:-1]
+            bits = (start + 1 + i for i, d in enumerate(digits) if d == "1")
+        out = []
+        for bit in bits:
+            if len(out) == size:
+                break
+            out.append(self.ids[bit])
+        return out
+
+    def query(
+        self, selected: Mapping[str, List[str]], base: Optional[int] = None
+    ) -> Tuple[int, Dict[str, List[dict]]]:
+        """
+        (mask of matching products, facet counts).
+        `selected` maps facet -> chosen values; `base` pre-filters (price, search).
+        """
+        base = self.all if base is None else base
+        per_facet = {}
+        for facet, values in selected.items():
+            table = self.bits.get(facet, {})
+            m = 0
+            for v in values:
+                m |= table.get(v, 0)
+            per_facet[facet] = m
+
+        mask = base
+        for m in per_facet.values():
+            mask &= m
+
+        counts: Dict[str, List[dict]] = {}
+        for facet, table in self.bits.items():
+            others = base
+            for f, m in per_facet.items():
+                if f != facet:
+                    others &= m
+            chosen = set(selected.get(facet, ()))
+            entries = []
+            for value, vbits in table.items():
+                n = (others & vbits).bit_count()
+                if n or value in chosen:
+                    entries.append({
+                        "value": value,
+                        "label": self.labels.get(facet, {}).get(value, value),
+                        "count": n,
+                        "selected": value in chosen,
+                    })
+            entries.sort(key=lambda e: (-e["count"], e["label"]))
+            counts[facet] = entries
+        return mask, counts
+
+
+def build_index() -> FacetIndex:
+    index = FacetIndex()
+    # name order comes from the database so it matches the cursor's collation
+    rows = Product.objects.order_by("name", "id").values_list(
+        "id", "name", "brand", "material", "price", "category_id", "category__name"
+    )
+    prices: List[Tuple[Decimal, int]] = []
+    for bit, (pid, name, brand, material, price, cat_id, cat_name) in enumerate(rows):
+        index.ids.append(pid)
+        index.position[pid] = bit
+        index.by_name[name] = bit
+        if brand:
+            index._add("brand", brand, bit)
+        if material:
+            index._add("material", material.lower(), bit, material)
+        index._add("category", cat_id, bit, cat_name)
+        index._add("price", _band(price), bit)
+        prices.append((price, bit))
+
+    prices.sort()
+    index.price_sorted = [p for p, _ in prices]
+    index.price_bits = [b for _, b in prices]
+
+    colors = dict(Color.objects.values_list("id", "name"))
+    for pid, cid in Product.colors.through.objects.values_list("product_id", "color_id"):
+        if pid in index.position:
+            index._add("color", cid, index.position[pid], colors.get(cid))
+    sizes = dict(Size.objects.values_list("id", "label"))
+    for pid, sid in Product.sizes.through.objects.values_list("product_id", "size_id"):
+        if pid in index.position:
+            index._add("size", sid, index.position[pid], sizes.get(sid))
+    return index
+
+
+_lock = threading.Lock()
+_index: Optional[FacetIndex] = None
+_version = None
+_built_at = 0.0
+
+
+def _stale(version) -> bool:
+    return _index is None or version != _version or time.monotonic() - _built_at > INDEX_TTL
+
+
+def get_index() -> FacetIndex:
+    """This process's index, rebuilt when the shared version has moved or it has aged out."""
+    global _index, _version, _built_at
+    version = cache.get(VERSION_KEY)
+    if _stale(version):
+        with _lock:
+            if _stale(version):
+                _index = build_index()
+                _version = version
+                _built_at = time.monotonic()
+    return _index
+
+
+# ---------------------------------------------------------------------------
+# Request helpers
+# ---------------------------------------------------------------------------
+def _decimal(raw: Optional[str]) -> Optional[Decimal]:
+    if raw in (None, ""):
+        return None
+    try:
+        return Decimal(raw)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def wants_facets(params: Mapping[str, str]) -> bool:
+    return any(params.get(p) for p in (*PARAMS, "price", "price_min", "price_max", "facets"))
+
+
+def facet_match(
+    params, ids: Optional[Iterable[int]] = None
+) -> Tuple[FacetIndex, Optional[int], Dict[str, List[dict]]]:
+    """
+    Apply ?color=1,2&size=3&brand=..&material=..&category=..&price=10-20
+    &price_min=&price_max= (comma = OR). Returns (the index used, mask of
+    matches or None when nothing filters, facet counts). `ids` narrows the
+    base set (e.g. search).
+    """
+    index = get_index()
+    selected = {
+        facet: [v.strip().lower() if facet == "material" else v.strip()
+                for v in params.get(param, "").split(",") if v.strip()]
+        for param, facet in PARAMS.items()
+    }
+    selected = {k: v for k, v in selected.items() if v}
+    bands = [v.strip() for v in params.get("price", "").split(",") if v.strip()]
+    if bands:
+        selected["price"] = bands
+
+    base = index.all if ids is None else index.mask_for_ids(ids)
+    low, high = _decimal(params.get("price_min")), _decimal(params.get("price_max"))
+    if low is not None or high is not None:
+        base &= index.price_mask(low, high)
+
+    mask, counts = index.query(selected, base)
+    filtered = ids is not None or bool(selected) or low is not None or high is not None
+    return index, (mask if filtered else None), counts
+
+
+def facet_filter(params, ids: Optional[Iterable[int]] = None) -> Tuple[Optional[List[int]], Dict[str, List[dict]]]:
+    """facet_match() as (matching ids in name order or None, facet counts)."""
+    index, mask, counts = facet_match(params, ids)
+    return (None if mask is None else index.ids_in(mask)), counts
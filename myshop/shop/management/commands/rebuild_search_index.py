@@ -0,0 +1,17 @@
+# shop/management/commands/rebuild_search_index.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from shop.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index (normally kept current by signals)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Products reindexed per transaction.")
+
+    def handle(self, *args, **opts):
+        n = rebuild_index(opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} products."))
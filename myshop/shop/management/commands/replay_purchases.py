@@ -0,0 +1,39 @@
+# shop/management/commands/replay_purchases.py
+from __future__ import annotations
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+
+from orders.models import OrderItem
+from shop.recommender import Recommender
+
+
+class Command(BaseCommand):
+    help = "Rebuild Redis co-purchase scores by replaying paid OrderItem history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="Delete existing co-purchase keys first.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Orders per Redis pipeline.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="OrderItem rows fetched per DB round trip.")
+
+    def handle(self, *args, **opts):
+        r = Recommender()
+        if opts["clear"]:
+            r.clear_purchases()
+
+        rows = (
+            OrderItem.objects
+            .filter(order__paid=True)
+            .order_by("order_id")
+            .values_list("order_id", "product_id")
+            .iterator(chunk_size=opts["chunk_size"])
+        )
+        baskets = (
+            [pid for _, pid in lines]
+            for _, lines in groupby(rows, key=itemgetter(0))
+        )
+        processed = r.bulk_products_bought(baskets, batch_size=opts["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Replayed {processed} paid orders into co-purchase scores."))
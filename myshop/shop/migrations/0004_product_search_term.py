@@ -0,0 +1,73 @@
+# Generated by Django 5.0.11 on 2026-10-17 19:37
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# frozen copy of shop/search.py as of this migration, so later changes to the
+# live tokenizer do not change what this backfill writes
+FIELD_WEIGHTS = {"name": 4.0, "category": 3.0, "brand": 3.0, "material": 2.0, "description": 1.0}
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "with",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [t for t in _WORD.findall((text or "").lower()) if 2 <= len(t) <= 40 and t not in STOPWORDS]
+
+
+def product_terms(product):
+    texts = {
+        "name": product.name,
+        "category": product.category.name if product.category_id else "",
+        "brand": product.brand,
+        "material": product.material,
+        "description": product.description,
+    }
+    terms = Counter()
+    for name, text in texts.items():
+        for term in set(tokenize(text)):
+            terms[term] += FIELD_WEIGHTS[name]
+    return terms
+
+
+def build_index(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductSearchTerm = apps.get_model("shop", "ProductSearchTerm")
+    rows = []
+    for product in Product.objects.select_related("category").iterator(chunk_size=500):
+        rows.extend(
+            ProductSearchTerm(term=term, product_id=product.pk, weight=weight)
+            for term, weight in product_terms(product).items()
+        )
+        if len(rows) >= 5000:
+            ProductSearchTerm.objects.bulk_create(rows)
+            rows = []
+    ProductSearchTerm.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.FloatField(default=0.0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='shop.product')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
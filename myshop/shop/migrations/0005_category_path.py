@@ -0,0 +1,43 @@
+# Generated by Django 5.0.11 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Category = apps.get_model("shop", "Category")
+    rows = {pk: parent for pk, parent in Category.objects.values_list("id", "parent_id")}
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk not in paths:
+            parent = rows.get(pk)
+            if parent is None or parent in seen or parent not in rows:
+                paths[pk] = f"{pk}/"
+            else:
+                paths[pk] = path_of(parent, seen + (pk,)) + f"{pk}/"
+        return paths[pk]
+
+    for pk in rows:
+        path = path_of(pk)
+        Category.objects.filter(pk=pk).update(path=path, depth=path.count("/") - 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_search_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.urls import reverse
@@ -14,6 +16,11 @@ class Category(models.Model):
         blank=True,
         null=True  # Root categories will have no parent
     )
+    # Materialised path of ancestor ids incl. this one, e.g. "3/17/42/";
+    # maintained by save(), so a whole subtree is one path__startswith filter
+    path = models.CharField(max_length=255, db_index=True, blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['name']
         indexes = [
@@ -23,10 +30,48 @@ class Category(models.Model):
         verbose_name_plural = 'categories'
 
     def __str__(self):
-        if self.parent:
-            return f"{self.parent} -> {self.name}"  # Show hierarchy in admin
-        return self.name
-    
+        # Show hierarchy in admin without a query per level
+        return " -> ".join(self.ancestor_names() + [self.name])
+
+    def ancestor_names(self):
+        if not self.parent_id:
+            return []
+        if Category.parent.is_cached(self):
+            return self.parent.ancestor_names() + [self.parent.name]
+        from .category_tree import category_names
+        names = category_names()
+        return [names.get(int(pk), '?') for pk in self.path.split('/')[:-2]]
+
+    def save(self, *args, **kwargs):
+        if self.parent_id:
+            parent_path = (
+                self.parent.path if Category.parent.is_cached(self) and self.parent.path
+                else Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            )
+        else:
+            parent_path = ''
+        old_path, old_depth = self.path, self.depth
+        if old_path and parent_path.startswith(old_path):
+            raise ValidationError('A category cannot be moved under itself or one of its descendants.')
+
+        super().save(*args, **kwargs)
+
+        new_path = f"{parent_path}{self.pk}/"
+        if new_path != old_path:
+            new_depth = new_path.count('/') - 1
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+            if old_path:
+                # move the whole subtree in one statement
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (new_depth - old_depth),
+                )
+            self.path, self.depth = new_path, new_depth
+
+    def get_descendants(self, include_self=True):
+        qs = Category.objects.filter(path__startswith=self.path)
+        return qs if include_self else qs.exclude(pk=self.pk)
+
     def get_absolute_url(self):
         return reverse('shop:product_list_by_category', args=[self.slug])
     
@@ -63,6 +108,22 @@ class Size(models.Model):
     label = models.CharField(max_length=10)  # e.g. '5-9', '9-11'
 
 
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, category):
+        """Products of `category` and all its descendants (a single JOIN on the path index)."""
+        if category.pk is None:
+            raise ValueError("in_category() needs a saved category.")
+        if category.path:
+            return self.filter(category__path__startswith=category.path)
+        # path not filled in yet (rows written around save()): walk the
+        # children one level per query; an empty prefix would match everything
+        ids, level = [], [category.pk]
+        while level:
+            ids += level
+            level = list(Category.objects.filter(parent_id__in=level).values_list('id', flat=True))
+        return self.filter(category_id__in=ids)
+
+
 class Product(models.Model):
     category = models.ForeignKey(
         'Category',
@@ -96,6 +157,8 @@ class Product(models.Model):
     # New field for customer ratings
     rating = models.FloatField(default=0.0)  # Store rating as a float value (0 - 5)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         indexes = [
@@ -170,3 +233,17 @@ class MarketingImage(models.Model):
 
     def __str__(self):
         return self.title or f"MarketingImage #{self.pk}"
+
+
+class ProductSearchTerm(models.Model):
+    """Inverted index for shop.search: one row per (term, product)."""
+    term = models.CharField(max_length=40)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField(default=0.0)
+
+    class Meta:
+        # (term, product) also serves the term-prefix range scans
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
@@ -1,20 +1,47 @@
-import redis
-from django.conf import settings
+from collections import Counter
+from itertools import islice
 
-from .models import Product
+from core.redis_client import REDIS_ERRORS, get_redis, is_degraded, mark_degraded
 
-# connect to redis
+from .models import Product
 
-REDIS_HOST = getattr(settings, "REDIS_HOST", "127.0.0.1")
-REDIS_PORT = getattr(settings, "REDIS_PORT", 6379)
-REDIS_DB   = getattr(settings, "REDIS_DB", 0)
+# Sum the scores of several purchased_with sets, drop the anchor products and
+# return only the top N members. Runs atomically server-side with no temp keys.
+# KEYS: product keys; ARGV[1]: max results; ARGV[2..]: ids to exclude
+SUGGEST_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local exclude = {}
+for i = 2, #ARGV do exclude[ARGV[i]] = true end
+local scores = {}
+for _, key in ipairs(KEYS) do
+    local rows = redis.call('ZRANGE', key, 0, -1, 'WITHSCORES')
+    for i = 1, #rows, 2 do
+        local member = rows[i]
+        if not exclude[member] then
+            scores[member] = (scores[member] or 0) + tonumber(rows[i + 1])
+        end
+    end
+end
+local ranked = {}
+for member, score in pairs(scores) do ranked[#ranked + 1] = {member, score} end
+table.sort(ranked, function(a, b)
+    if a[2] == b[2] then return a[1] > b[1] end
+    return a[2] > b[2]
+end)
+local out = {}
+for i = 1, math.min(limit, #ranked) do out[i] = ranked[i][1] end
+return out
+"""
+# registered once per process (register_script only hashes the source;
+# calls run EVALSHA and load the script on the server if it is missing)
+_suggest_script = None
 
 
-r = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-)
+def _suggest(r, keys, args):
+    global _suggest_script
+    if _suggest_script is None:
+        _suggest_script = r.register_script(SUGGEST_SCRIPT)
+    return _suggest_script(keys=keys, args=args, client=r)
 
 
 class Recommender:
@@ -23,48 +50,77 @@ class Recommender:
 
     def products_bought(self, products):
         product_ids = [p.id for p in products]
-        for product_id in product_ids:
-            for with_id in product_ids:
-                # get the other products bought with each product
-                if product_id != with_id:
+        self.bulk_products_bought([product_ids])
+
+    def bulk_products_bought(self, baskets, batch_size=500):
+        """
+        Record co-purchases for many orders at once.
+        - baskets: iterable of product id lists, one per order
+        - batch_size: orders folded into each pipeline round trip
+
+        Increments are summed per (product, other) in Python first, so each
+        batch sends one ZINCRBY per distinct pair in a single pipeline.
+        Returns the number of baskets processed.
+        """
+        baskets = iter(baskets)
+        processed = 0
+        while True:
+            batch = list(islice(baskets, batch_size))
+            if not batch:
+                break
+            increments = Counter()
+            for basket in batch:
+                product_ids = list(dict.fromkeys(int(id) for id in basket))
+                for product_id in product_ids:
+                    for with_id in product_ids:
+                        # get the other products bought with each product
+                        if product_id != with_id:
+                            increments[(product_id, with_id)] += 1
+            if increments:
+                pipe = get_redis().pipeline(transaction=False)
+                for (product_id, with_id), amount in increments.items():
                     # increment score for product purchased together
-                    r.zincrby(
-                        self.get_product_key(product_id), 1, with_id
+                    pipe.zincrby(
+                        self.get_product_key(product_id), amount, with_id
                     )
+                pipe.execute()
+            processed += len(batch)
+        return processed
 
     def suggest_products_for(self, products, max_results=6):
+        """
+        Return up to max_results products bought together with `products`.
+        Returns [] without waiting on Redis while it is marked degraded.
+        """
         product_ids = [p.id for p in products]
-        if len(products) == 1:
-            # only 1 product
-            suggestions = r.zrange(
-                self.get_product_key(product_ids[0]), 0, -1, desc=True
-            )[:max_results]
-        else:
-            # generate a temporary key
-            flat_ids = ''.join([str(id) for id in product_ids])
-            tmp_key = f'tmp_{flat_ids}'
-            # multiple products, combine scores of all products
-            # store the resulting sorted set in a temporary key
-            keys = [self.get_product_key(id) for id in product_ids]
-            r.zunionstore(tmp_key, keys)
-            # remove ids for the products the recommendation is for
-            r.zrem(tmp_key, *product_ids)
-            # get the product ids by their score, descendant sort
-            suggestions = r.zrange(
-                tmp_key, 0, -1, desc=True
-            )[:max_results]
-            # remove the temporary key
-            r.delete(tmp_key)
+        if not product_ids or max_results <= 0 or is_degraded():
+            return []
+        r = get_redis()
+        try:
+            if len(products) == 1:
+                # only 1 product
+                suggestions = r.zrange(
+                    self.get_product_key(product_ids[0]), 0, max_results - 1, desc=True
+                )
+            else:
+                # multiple products, combine scores of all products, remove ids
+                # for the products the recommendation is for and keep the top N
+                keys = [self.get_product_key(id) for id in product_ids]
+                suggestions = _suggest(r, keys, [max_results, *product_ids])
+        except REDIS_ERRORS as e:
+            mark_degraded(e)
+            return []
         suggested_products_ids = [int(id) for id in suggestions]
         # get suggested products and sort by order of appearance
+        rank = {id: i for i, id in enumerate(suggested_products_ids)}
         suggested_products = list(
             Product.objects.filter(id__in=suggested_products_ids)
         )
-        suggested_products.sort(
-            key=lambda x: suggested_products_ids.index(x.id)
-        )
+        suggested_products.sort(key=lambda x: rank[x.id])
         return suggested_products
 
     def clear_purchases(self):
-        for id in Product.objects.values_list('id', flat=True):
-            r.delete(self.get_product_key(id))
\ No newline at end of file
+        pipe = get_redis().pipeline(transaction=False)
+        for id in Product.objects.values_list('id', flat=True).iterator():
+            pipe.delete(self.get_product_key(id))
+        pipe.execute()
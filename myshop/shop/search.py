@@ -0,0 +1,193 @@
+# shop/search.py
+"""
+Product search over an inverted index (ProductSearchTerm).
+
+Every product is tokenised into weighted terms (name > category/brand >
+material > description). A query token matches its exact term or, at a lower
+weight, any term it is a prefix of. The lookup is a range scan
+(term >= token AND term < token + U+FFFF) on the (term, product) unique
+index and never scans the product table. A LIKE 'token%' (term__startswith)
+cannot use that index: SQLite's LIKE is case-insensitive and PostgreSQL
+needs a varchar_pattern_ops index outside the C collation. Every query token must match. Results are ranked
+by summed weight, and facet counts come from the matching products. Queries
+made only of stopwords or one-letter words have nothing in the index, so they
+fall back to a substring match on the product name.
+signals.py keeps the index current when products or categories are saved.
+migrations/0004 carries a frozen copy of tokenize() and product_terms() for
+its backfill; change those here without touching it.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from .models import Product, ProductSearchTerm
+
+FIELD_WEIGHTS = {
+    "name": 4.0,
+    "category": 3.0,
+    "brand": 3.0,
+    "material": 2.0,
+    "description": 1.0,
+}
+# Product fields whose change requires reindexing (category covers category_id)
+INDEXED_FIELDS = {"name", "category", "category_id", "brand", "material", "description"}
+PREFIX_FACTOR = 0.5
+MIN_TOKEN = 2
+MAX_TOKEN = 40
+MAX_QUERY_TOKENS = 8
+# cap for the unindexed name match used when a query has no indexable token
+FALLBACK_LIMIT = 200
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "with",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [
+        t for t in _WORD.findall((text or "").lower())
+        if MIN_TOKEN <= len(t) <= MAX_TOKEN and t not in STOPWORDS
+    ]
+
+
+def product_terms(product: Product) -> Dict[str, float]:
+    """term -> weight; each field counts once per distinct term."""
+    texts = {
+        "name": product.name,
+        "category": product.category.name if product.category_id else "",
+        "brand": product.brand,
+        "material": product.material,
+        "description": product.description,
+    }
+    terms: Dict[str, float] = Counter()
+    for name, text in texts.items():
+        for term in set(tokenize(text)):
+            terms[term] += FIELD_WEIGHTS[name]
+    return terms
+
+
+# ---------------------------------------------------------------------------
+# Indexing
+# ---------------------------------------------------------------------------
+def index_products(products: Iterable[Product]) -> int:
+    """Replace the index rows of `products` (load them with category)."""
+    products = list(products)
+    rows = [
+        ProductSearchTerm(term=term, product_id=p.pk, weight=weight)
+        for p in products
+        for term, weight in product_terms(p).items()
+    ]
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product_id__in=[p.pk for p in products]).delete()
+        ProductSearchTerm.objects.bulk_create(rows, batch_size=2000)
+    return len(products)
+
+
+def reindex(product_ids: Iterable[int]) -> int:
+    return index_products(Product.objects.select_related("category").filter(id__in=list(product_ids)))
+
+
+def rebuild_index(batch_size: int = 500) -> int:
+    ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), batch_size):
+        reindex(ids[start:start + batch_size])
+    # rows of products deleted outside the ORM (FK cascade covers the rest)
+    ProductSearchTerm.objects.exclude(product_id__in=Product.objects.values("id")).delete()
+    return len(ids)
+
+
+# ---------------------------------------------------------------------------
+# Querying
+# ---------------------------------------------------------------------------
+@dataclass
+class SearchResult:
+    ids: List[int] = field(default_factory=list)            # ranked, best first
+    scores: Dict[int, float] = field(default_factory=dict)
+    facets: Dict[str, List[dict]] = field(default_factory=dict)
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+
+def _match(token: str) -> Dict[int, float]:
+    """product -> best weight for one query token (exact beats prefix)."""
+    best: Dict[int, float] = {}
+    rows = (
+        ProductSearchTerm.objects
+        .filter(term__gte=token, term__lt=token + "\uffff")
+        .values_list("product_id", "term", "weight")
+    )
+    for pid, term, weight in rows.iterator():
+        score = weight if term == token else weight * PREFIX_FACTOR
+        if score > best.get(pid, 0.0):
+            best[pid] = score
+    return best
+
+
+def _match_all(tokens: List[str]) -> Dict[int, float]:
+    """product -> summed weight, for products matching every token."""
+    scores: Optional[Dict[int, float]] = None
+    for token in tokens:
+        matched = _match(token)
+        if scores is None:
+            scores = matched
+        else:
+            scores = {pid: s + matched[pid] for pid, s in scores.items() if pid in matched}
+        if not scores:
+            return {}
+    return scores or {}
+
+
+def _match_name(text: str) -> Dict[int, float]:
+    """Unindexed fallback: products whose name contains `text`."""
+    ids = Product.objects.filter(name__icontains=text).order_by("id").values_list("id", flat=True)
+    return dict.fromkeys(ids[:FALLBACK_LIMIT], FIELD_WEIGHTS["name"])
+
+
+def search_products(query: Optional[str], *, available_only: bool = True) -> SearchResult:
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    text = (query or "").strip()
+    if tokens:
+        scores = _match_all(tokens)
+    elif text:
+        # "the", "a b": nothing indexed for these
+        scores = _match_name(text)
+    else:
+        return SearchResult()
+    if not scores:
+        return SearchResult()
+
+    # one query: availability filter plus everything the facets need
+    products = Product.objects.filter(id__in=list(scores))
+    if available_only:
+        products = products.filter(available=True)
+    rows = list(products.values_list("id", "category_id", "category__name", "brand"))
+
+    categories: Counter = Counter()
+    brands: Counter = Counter()
+    names: Dict[int, str] = {}
+    for _pid, cat_id, cat_name, brand in rows:
+        categories[cat_id] += 1
+        names[cat_id] = cat_name
+        if brand:
+            brands[brand] += 1
+
+    ids = sorted((r[0] for r in rows), key=lambda pid: (-scores[pid], pid))
+    return SearchResult(
+        ids=ids,
+        scores={pid: scores[pid] for pid in ids},
+        facets={
+            "category": [
+                {"id": cid, "name": names[cid], "count": n} for cid, n in categories.most_common()
+            ],
+            "brand": [{"value": b, "count": n} for b, n in brands.most_common()],
+        },
+    )
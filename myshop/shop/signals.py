@@ -0,0 +1,47 @@
+# shop/signals.py
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import category_tree, facets
+from .models import Category, Color, Product, Size
+from .search import INDEXED_FIELDS, reindex
+
+
+@receiver(post_save, sender=Product)
+def _index_product(sender, instance: Product, update_fields=None, **kwargs):
+    # e.g. stock or rating updates do not touch the search index
+    if update_fields and not (set(update_fields) & INDEXED_FIELDS):
+        return
+    transaction.on_commit(lambda: reindex([instance.pk]))
+
+
+@receiver(post_save, sender=Category)
+def _index_category(sender, instance: Category, created: bool, update_fields=None, **kwargs):
+    if created or (update_fields and "name" not in update_fields):
+        return
+    transaction.on_commit(
+        lambda: reindex(Product.objects.filter(category_id=instance.pk).values_list("id", flat=True))
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+@receiver(m2m_changed, sender=Product.colors.through)
+@receiver(m2m_changed, sender=Product.sizes.through)
+def _refresh_facets(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        transaction.on_commit(facets.bump_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def _refresh_category_tree(sender, **kwargs):
+    transaction.on_commit(category_tree.invalidate)
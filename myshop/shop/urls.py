@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -8,7 +9,7 @@ from .views import (
     gallery_view
 )
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from recommender.graphql_view import ShopGraphQLView
 from products.views import ProductViewSet
 from customers.views import CustomerViewSet
 from inventory.views import StockLedgerViewSet
@@ -42,6 +43,6 @@ urlpatterns = [
 
     path('shop/', views.product_lists, name='product_lists'),
     path('shop/<slug:category_slug>/', views.product_lists, name='product_lists_by_category'),
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql", csrf_exempt(ShopGraphQLView.as_view(graphiql=settings.GRAPHQL_GRAPHIQL))),
 
 ]
@@ -1,8 +1,11 @@
+from django.db.models import Case, When
 from django.shortcuts import get_object_or_404, render
 from .models import Banner
 from cart.forms import CartAddProductForm
 from .models import Category, Product, SubCategory
 from .recommender import Recommender
+from .search import search_products
+from recommendation.events import log_interaction
 from .models import GalleryImage
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
@@ -30,6 +33,13 @@ def csrf_view(request):
 
 
 
+def _category_products(request, products, category):
+    """Products filed directly under `category`; ?subcategories=1 adds its descendants."""
+    if request.GET.get('subcategories') in ('1', 'true'):
+        return products.in_category(category)
+    return products.filter(category=category)
+
+
 def product_list(request, category_slug=None,  subcategory_slug=None):
     category = None
     subcategory = None
@@ -39,14 +49,19 @@ def product_list(request, category_slug=None,  subcategory_slug=None):
     gallery_images = GalleryImage.objects.all()
     
 
-    # Search functionality
-    query = request.GET.get('q')
-    if query:
-        products = products.filter(name__icontains=query)  # Search by product name
-
     if category_slug:
        category = get_object_or_404(Category, slug=category_slug)
-       products = Product.objects.filter(category=category)
+       products = _category_products(request, products, category)
+
+    # Search functionality (inverted index, ranked; see shop/search.py)
+    query = request.GET.get('q')
+    if query:
+        ranked = search_products(query).ids[:200]  # best matches only
+        products = products.filter(id__in=ranked)
+        if ranked:
+            products = products.order_by(
+                Case(*[When(id=pid, then=pos) for pos, pid in enumerate(ranked)])
+            )
 
 
     return render(
@@ -69,6 +84,12 @@ def product_detail(request, id, slug):
         Product, id=id, slug=slug, available=True
     )
     cart_product_form = CartAddProductForm()
+    # queued, not inserted: see recommendation/events.py
+    log_interaction(
+        request.user.pk if request.user.is_authenticated else request.session.session_key,
+        product.id,
+        'view',
+    )
     r = Recommender()
     recommended_products = r.suggest_products_for([product], 4)
     return render(
@@ -88,7 +109,7 @@ def product_lists(request, category_slug=None):
 
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
+        products = _category_products(request, products, category)
 
     return render(request, 'shop/product/list.html', {
         'category': category,
@@ -104,7 +125,8 @@ def gallery_view(request):
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    # children are prefetched (and their parent cached) so str() costs nothing
+    queryset = Category.objects.prefetch_related('child_categories')
     serializer_class = CategorySerializer
 
 class SubCategoryViewSet(viewsets.ModelViewSet):
@@ -1,5 +1,5 @@
 // src/pages/Products.jsx
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import { api } from "../lib/http";
 import {
   AppBar,
@@ -46,78 +46,120 @@ const resolveUrl = (u) => {
 const fmtMoney = (v) =>
   Number(v ?? 0).toLocaleString(undefined, { style: "currency", currency: "USD" });
 
-const getCategory = (p) =>
-  (typeof p.category === "object" ? p?.category?.name : p?.category_name) || "";
+// UI sort -> ?ordering= on /api/products/ (search results stay in rank order)
+const ORDERING = {
+  newest: "-created",
+  "price-asc": "price",
+  "price-desc": "-price",
+  name: "name",
+};
+const PAGE_SIZE = 48;
+
+const normalize = (rows) =>
+  rows.map((p) => ({
+    ...p,
+    _image: resolveUrl(p.image || p.image_url || p.thumbnail || p.file),
+  }));
+
+// `next` is absolute; keep only path + query so it goes through BASE / the dev proxy
+const relative = (url) => {
+  if (!url) return null;
+  const u = new URL(url);
+  return u.pathname + u.search;
+};
 
 /* -------- page -------- */
 export default function Products() {
   const [items, setItems] = useState(null);
+  const [next, setNext] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [err, setErr] = useState("");
   const [q, setQ] = useState("");
+  const [query, setQuery] = useState("");
+  const [categories, setCategories] = useState([]);
   const [category, setCategory] = useState("All");
   const [sort, setSort] = useState("newest");
   const [view, setView] = useState("grid");
 
+  // search as the shopper pauses typing, not on every keystroke
+  useEffect(() => {
+    const t = setTimeout(() => setQuery(q.trim()), 300);
+    return () => clearTimeout(t);
+  }, [q]);
+
+  // first page for the current filters; the server filters, sorts and pages
+  const firstPage = useMemo(() => {
+    const params = new URLSearchParams();
+    if (category !== "All") params.set("category", category);
+    if (query) {
+      params.set("q", query);
+      params.set("limit", PAGE_SIZE);
+      return `/api/products/search/?${params}`;
+    }
+    params.set("page_size", PAGE_SIZE);
+    params.set("ordering", ORDERING[sort] || "-created");
+    params.set("facets", 1);
+    return `/api/products/?${params}`;
+  }, [query, category, sort]);
+
+  const fetchPage = async (path) => {
+    const data = await api(path, { credentials: "include" });
+    if (Array.isArray(data)) return { rows: data, next: null };
+    const rows = Array.isArray(data?.results) ? data.results : [];
+    if (data?.facets?.category && !data.query) setCategories(data.facets.category);
+    if (data?.query !== undefined) {
+      // search pages by offset: /api/products/search/?q=..&limit=..&offset=..
+      const u = new URL(path, window.location.origin);
+      const offset = Number(u.searchParams.get("offset") || 0) + rows.length;
+      u.searchParams.set("offset", offset);
+      return { rows, next: offset < (data.count ?? 0) ? u.pathname + u.search : null };
+    }
+    return { rows, next: relative(data?.next) };
+  };
+
+  // the filters a load-more belongs to; a reply for older filters is dropped
+  const current = useRef(firstPage);
+
   useEffect(() => {
+    let cancelled = false;
+    current.current = firstPage;
+    setItems(null);
+    setNext(null);
     (async () => {
       try {
-        const data = await api("/api/products/", { credentials: "include" });
-        const rows = Array.isArray(data) ? data : Array.isArray(data?.results) ? data.results : [];
-        const norm = rows.map((p) => ({
-          ...p,
-          _image: resolveUrl(p.image || p.image_url || p.thumbnail || p.file),
-        }));
-        setItems(norm);
+        const page = await fetchPage(firstPage);
+        if (cancelled) return;
+        setItems(normalize(page.rows));
+        setNext(page.next);
       } catch (e) {
-        setErr(e.message || "Failed to load products");
+        if (!cancelled) setErr(e.message || "Failed to load products");
       }
     })();
-  }, []);
-
-  const categories = useMemo(() => {
-    if (!items) return ["All"];
-    const set = new Set(items.map(getCategory).filter(Boolean));
-    return ["All", ...Array.from(set).sort()];
-  }, [items]);
-
-  const filtered = useMemo(() => {
-    if (!items) return [];
-    let rows = [...items];
-
-    if (category !== "All") rows = rows.filter((p) => getCategory(p) === category);
-
-    if (q.trim()) {
-      const needle = q.trim().toLowerCase();
-      rows = rows.filter((p) =>
-        [p.name, p.description, getCategory(p), p.brand]
-          .map((x) => (x || "").toString().toLowerCase())
-          .join(" ")
-          .includes(needle)
-      );
-    }
+    return () => {
+      cancelled = true;
+    };
+  }, [firstPage]);
 
-    switch (sort) {
-      case "price-asc":
-        rows.sort((a, b) => Number(a.price ?? a.unit_price ?? 0) - Number(b.price ?? b.unit_price ?? 0));
-        break;
-      case "price-desc":
-        rows.sort((a, b) => Number(b.price ?? b.unit_price ?? 0) - Number(a.price ?? a.unit_price ?? 0));
-        break;
-      case "name":
-        rows.sort((a, b) => String(a.name).localeCompare(String(b.name)));
-        break;
-      default:
-        rows.sort((a, b) => String(b.id).localeCompare(String(a.id)));
+  const loadMore = async () => {
+    if (!next || loadingMore) return;
+    setLoadingMore(true);
+    const from = current.current;
+    try {
+      const page = await fetchPage(next);
+      if (from !== current.current) return;
+      setItems((prev) => [...(prev || []), ...normalize(page.rows)]);
+      setNext(page.next);
+    } catch (e) {
+      setErr(e.message || "Failed to load products");
+    } finally {
+      setLoadingMore(false);
     }
-    return rows;
-  }, [items, q, category, sort]);
+  };
 
-  // Anchor for AI recs — prefer first of filtered (respects search/category), fallback to first item
-  const featuredProductId = useMemo(() => {
-    if (filtered.length) return filtered[0].id;
-    if (items?.length) return items[0].id;
-    return null;
-  }, [filtered, items]);
+  const filtered = items || [];
+
+  // Anchor for AI recs — first of the current results (respects search/category)
+  const featuredProductId = useMemo(() => (filtered.length ? filtered[0].id : null), [filtered]);
 
   if (err) return <Typography color="error" sx={{ p: 3 }}>{err}</Typography>;
 
@@ -233,6 +275,7 @@ export default function Products() {
             size="small"
             value={sort}
             onChange={(e) => setSort(e.target.value)}
+            disabled={!!query}
             sx={{
               color: "#f5deb3",
               minWidth: 140,
@@ -289,17 +332,17 @@ export default function Products() {
             background: "rgba(245,222,179,0.08)",
           }}
         />
-        {categories.map((c) => (
+        {[{ value: "All", label: "All" }, ...categories].map((c) => (
           <Chip
-            key={c}
-            label={c}
+            key={c.value}
+            label={c.label}
             variant="outlined"
-            onClick={() => setCategory(c)}
+            onClick={() => setCategory(c.value)}
             clickable
             sx={{
               color: "white",
-              borderColor: category === c ? "rgba(245,222,179,0.45)" : "rgba(245,222,179,0.35)",
-              background: category === c ? "rgba(245,222,179,0.22)" : "transparent",
+              borderColor: category === c.value ? "rgba(245,222,179,0.45)" : "rgba(245,222,179,0.35)",
+              background: category === c.value ? "rgba(245,222,179,0.22)" : "transparent",
               "&:hover": {
                 borderColor: "#f5deb3",
                 background: "rgba(245,222,179,0.22)",
@@ -499,6 +542,25 @@ export default function Products() {
             ))}
           </Grid>
         )}
+
+        {next && (
+          <Box sx={{ textAlign: "center", mt: 4 }}>
+            <Button
+              variant="outlined"
+              onClick={loadMore}
+              disabled={loadingMore}
+              sx={{
+                borderRadius: 999,
+                px: 4,
+                color: "#f5deb3",
+                borderColor: "rgba(245,222,179,0.55)",
+                "&:hover": { backgroundColor: "rgba(245,222,179,0.15)", borderColor: "#f5deb3" },
+              }}
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </Button>
+          </Box>
+        )}
       </Box>
 
       